@@ -0,0 +1,153 @@
+"""
+Shared cache and index write coordination for multi-worker deployments.
+Every gunicorn worker on a host opens the same SQLite file (WAL mode), so
+cached embeddings/answers and the corpus version are visible to all of them.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to in-process locking only
+    fcntl = None
+
+
+DATA_DIR = Path(os.getenv("RAG_DATA_DIR", ".rag_data"))
+
+
+def cache_key(*parts: Any) -> str:
+    """Build a stable cache key from JSON-serializable parts"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SharedCache:
+    """
+    File-backed key/value cache shared across worker processes.
+
+    Entries live in named buckets (e.g. "query_embedding", "answer:<namespace>")
+    and are stored as JSON. Each namespace has a corpus version, bumped on every
+    write to it; anything derived from the corpus should include it in its key.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 10000):
+        self.path = Path(path) if path else DATA_DIR / "cache.db"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "bucket TEXT, key TEXT, value TEXT, created REAL, "
+            "PRIMARY KEY (bucket, key))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (SQLite connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, bucket: str, key: str) -> Optional[Any]:
+        """Return a cached value or None"""
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE bucket = ? AND key = ?", (bucket, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, bucket: str, key: str, value: Any):
+        """Store a value, evicting the oldest entries once over capacity"""
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (bucket, key, value, created) VALUES (?, ?, ?, ?)",
+            (bucket, key, json.dumps(value), time.time())
+        )
+        conn.commit()
+
+        # Checking the size on every write is wasteful; do it periodically
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._evict()
+
+    def _evict(self):
+        """Trim the cache back to max_entries, oldest first"""
+        conn = self._conn()
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN "
+                "(SELECT rowid FROM entries ORDER BY created ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            conn.commit()
+
+    def invalidate(self, bucket: str):
+        """Drop every entry in a bucket"""
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE bucket = ?", (bucket,))
+        conn.commit()
+
+    def corpus_version(self, namespace: str = "") -> int:
+        """Current corpus version of a namespace as seen by all workers"""
+        row = self._conn().execute(
+            "SELECT value FROM meta WHERE name = ?", (f"corpus_version:{namespace}",)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_corpus_version(self, namespace: str = "") -> int:
+        """Increment a namespace's corpus version after an index write"""
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (f"corpus_version:{namespace}",)
+        )
+        conn.commit()
+        return self.corpus_version(namespace)
+
+
+class WriterLock:
+    """
+    Single-writer lock for index mutations (ingest, clear).
+
+    An asyncio lock keeps one writer per process; an flock on a shared file
+    keeps one writer per host. The flock is taken in a worker thread so that
+    waiting for another process never blocks the event loop.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else DATA_DIR / "writer.lock"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._async_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._async_lock:
+            with open(self.path, "a+") as fh:
+                if fcntl:
+                    await asyncio.to_thread(fcntl.flock, fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+__all__ = ['SharedCache', 'WriterLock', 'cache_key', 'DATA_DIR']
@@ -0,0 +1,62 @@
+"""
+Compact chunk representation for the ingest path
+A ChunkBatch holds all chunks of one document as parallel integer arrays of
+offsets into the source text, rather than one model object (and one copy of
+the text) per chunk. Chunk text is materialized only when it is embedded or
+written to the vector store.
+"""
+
+from array import array
+from typing import Iterator
+
+
+class ChunkBatch:
+    """
+    Struct-of-arrays view of one document's chunks.
+
+    Pieces (sentences, or the words of an over-long sentence) are
+    (start, end) spans into the source text, in reading order. Each chunk
+    is a contiguous run of pieces [lo, hi), joined with single spaces;
+    overlapping chunks share pieces instead of copying text. Token counts
+    tallied while chunking are kept, so callers never re-tokenize.
+    """
+
+    __slots__ = ("source_text", "source_tokens", "piece_starts", "piece_ends", "chunk_lo", "chunk_hi", "chunk_tokens")
+
+    def __init__(self, source_text: str):
+        self.source_text = source_text
+        self.source_tokens = 0
+        self.piece_starts = array("q")
+        self.piece_ends = array("q")
+        self.chunk_lo = array("q")
+        self.chunk_hi = array("q")
+        self.chunk_tokens = array("q")
+
+    def add_piece(self, start: int, end: int) -> int:
+        """Register a span of the source text; returns its piece index"""
+        self.piece_starts.append(start)
+        self.piece_ends.append(end)
+        return len(self.piece_starts) - 1
+
+    def add_chunk(self, lo: int, hi: int, tokens: int):
+        """Register pieces [lo, hi) as the next chunk"""
+        self.chunk_lo.append(lo)
+        self.chunk_hi.append(hi)
+        self.chunk_tokens.append(tokens)
+
+    def piece(self, index: int) -> str:
+        return self.source_text[self.piece_starts[index]:self.piece_ends[index]]
+
+    def text(self, index: int) -> str:
+        """Materialize one chunk's text"""
+        return " ".join(self.piece(i) for i in range(self.chunk_lo[index], self.chunk_hi[index]))
+
+    def texts(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.text(index)
+
+    def __len__(self) -> int:
+        return len(self.chunk_lo)
+
+
+__all__ = ['ChunkBatch']
@@ -0,0 +1,163 @@
+"""
+Opt-in runtime diagnostics (RAG_DIAGNOSTICS=1)
+- Event-loop lag monitor: a watchdog thread notices when the loop stops
+  ticking and logs the stack of whatever callback is hogging it.
+- Sampling profiler: while requests to selected endpoints are in flight,
+  thread stacks are sampled into folded-stack format (flamegraph.pl,
+  speedscope and similar tools read it directly).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter, deque
+from typing import Any, Dict, Optional
+
+
+DIAGNOSTICS_ENABLED = os.getenv("RAG_DIAGNOSTICS", "0") == "1"
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("RAG_LOOP_LAG_THRESHOLD_MS", "100"))
+PROFILE_ENDPOINTS = [p for p in os.getenv("RAG_PROFILE_ENDPOINTS", "/query,/ingest").split(",") if p]
+PROFILE_INTERVAL_MS = float(os.getenv("RAG_PROFILE_INTERVAL_MS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def _folded_stack(frame) -> str:
+    """Render a frame chain root-first as 'module:function;module:function'"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.basename(code.co_filename).rsplit(".", 1)[0]
+        parts.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class LoopMonitor:
+    """Detects event-loop stalls and captures the blocking stack"""
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, interval_ms: float = 20):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.loop_thread_id: Optional[int] = None
+        self.last_beat = time.monotonic()
+        self.lags_ms: deque = deque(maxlen=1000)
+        self.stalls: deque = deque(maxlen=20)
+        self._stop = threading.Event()
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lags_ms.append(max(0.0, (now - expected) * 1000))
+            self.last_beat = now
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            stalled = time.monotonic() - self.last_beat
+            # Report each stall once, while it is still happening
+            if stalled < self.threshold or reported_beat == self.last_beat:
+                continue
+            reported_beat = self.last_beat
+            frame = sys._current_frames().get(self.loop_thread_id)  # type: ignore
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            self.stalls.append({"at": time.time(), "stalled_ms": round(stalled * 1000, 1), "stack": stack})
+            logger.warning("Event loop blocked for %.0f ms; stack:\n%s", stalled * 1000, stack)
+
+    def start(self):
+        """Call from inside the running loop"""
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._heartbeat = asyncio.create_task(self._beat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags_ms)
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1], 1) if lags else 0.0,
+            "lag_max_ms": round(lags[-1], 1) if lags else 0.0,
+            "recent_stalls": list(self.stalls)
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack while at least one profiled request is active.
+    Samples are credited to each endpoint in flight at the time, so overlapping
+    requests to different endpoints share samples.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.samples: Dict[str, Counter] = {}
+        self._active: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.loop_thread_id: Optional[int] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while True:
+            with self._lock:
+                endpoints = [e for e, n in self._active.items() if n > 0]
+                if not endpoints:
+                    self._thread = None
+                    return
+            for thread_id, frame in sys._current_frames().items():  # type: ignore
+                if thread_id == own:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                label = "event_loop" if thread_id == self.loop_thread_id else names.get(thread_id, "thread")
+                stack = f"{label};{_folded_stack(frame)}"
+                with self._lock:
+                    for endpoint in endpoints:
+                        self.samples.setdefault(endpoint, Counter())[stack] += 1
+            time.sleep(self.interval)
+
+    def begin(self, endpoint: str):
+        with self._lock:
+            self._active[endpoint] += 1
+            if self._thread is None:
+                self.loop_thread_id = threading.get_ident()
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, endpoint: str):
+        with self._lock:
+            self._active[endpoint] -= 1
+
+    def folded(self, endpoint: Optional[str] = None, reset: bool = False) -> str:
+        """Folded stacks ('frame;frame;frame count' per line) for one or all endpoints"""
+        with self._lock:
+            totals: Counter = Counter()
+            for name, counter in self.samples.items():
+                if endpoint is None or name == endpoint:
+                    totals.update(counter)
+            if reset:
+                if endpoint is None:
+                    self.samples.clear()
+                else:
+                    self.samples.pop(endpoint, None)
+        return "\n".join(f"{stack} {count}" for stack, count in totals.most_common())
+
+
+loop_monitor = LoopMonitor()
+profiler = SamplingProfiler()
+
+
+__all__ = ['DIAGNOSTICS_ENABLED', 'PROFILE_ENDPOINTS', 'loop_monitor', 'profiler']
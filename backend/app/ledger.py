@@ -0,0 +1,188 @@
+"""
+Usage ledger and per-tenant budgets
+Every request appends its billable units (embedding tokens, rerank searches,
+LLM tokens) to an append-only JSONL file. Writes are buffered and flushed in
+batches; totals are rebuilt by tailing the file, so budgets see spend from
+every worker process. The file is the only record of spend, so RAG_LEDGER_PATH
+should point at durable storage rather than the (possibly ephemeral) data dir.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .cache import DATA_DIR
+
+
+# USD per unit; override with RAG_PRICES='{"rerank_search": 0.002, ...}'
+DEFAULT_PRICES = {
+    "embed_token": 0.00002 / 1000,   # Gemini embeddings
+    "rerank_search": 0.001,          # Cohere rerank, per call
+    "prompt_token": 0.0007 / 1000,   # Groq Llama 70B input
+    "completion_token": 0.0008 / 1000,  # Groq Llama 70B output
+    "rewrite_prompt_token": 0.00005 / 1000,    # Groq Llama 8B input (query rewrite/condense)
+    "rewrite_completion_token": 0.00008 / 1000  # Groq Llama 8B output
+}
+
+# Ledger unit name -> price key
+UNIT_PRICES = {
+    "embed_tokens": "embed_token",
+    "rerank_searches": "rerank_search",
+    "prompt_tokens": "prompt_token",
+    "completion_tokens": "completion_token",
+    "rewrite_prompt_tokens": "rewrite_prompt_token",
+    "rewrite_completion_tokens": "rewrite_completion_token"
+}
+
+DEFAULT_TENANT = "anonymous"
+
+LEDGER_PATH = os.getenv("RAG_LEDGER_PATH")
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceeded(Exception):
+    """Raised for work that has no cheaper fallback once a tenant is over budget"""
+
+    def __init__(self, tenant: str):
+        super().__init__(f"Tenant '{tenant}' has used its budget for {current_period()}")
+        self.tenant = tenant
+
+
+def current_period() -> str:
+    """Budgets reset monthly (UTC)"""
+    return time.strftime("%Y-%m", time.gmtime())
+
+
+class UsageLedger:
+    """Append-only, batch-flushed usage log with per-tenant monthly totals"""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        flush_every: int = 50,
+        flush_interval: float = 2.0
+    ):
+        self.path = Path(path or LEDGER_PATH or DATA_DIR / "usage.jsonl")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.prices = {**DEFAULT_PRICES, **json.loads(os.getenv("RAG_PRICES", "{}"))}
+        self.budgets: Dict[str, float] = json.loads(os.getenv("RAG_TENANT_BUDGETS", "{}"))
+        if self.budgets and not (path or LEDGER_PATH):
+            logger.warning(
+                "RAG_TENANT_BUDGETS is set but RAG_LEDGER_PATH is not; spend is kept in %s "
+                "and budgets reset whenever that directory is wiped", self.path
+            )
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # (tenant, period) -> totals, from the file plus records still in the buffer
+        self._totals: Dict[tuple, Dict[str, float]] = {}
+        self._pending: Dict[tuple, Dict[str, float]] = {}
+        self._offset = 0
+
+    def cost(self, units: Dict[str, float]) -> float:
+        """Price a set of units"""
+        total = sum(
+            amount * self.prices[UNIT_PRICES[unit]]
+            for unit, amount in units.items()
+            if unit in UNIT_PRICES
+        )
+        return round(total, 6)
+
+    def record(self, tenant: str, kind: str, units: Dict[str, float]) -> float:
+        """Buffer one request's usage; returns its cost"""
+        cost = self.cost(units)
+        entry = {
+            "ts": time.time(),
+            "period": current_period(),
+            "tenant": tenant,
+            "kind": kind,
+            "units": units,
+            "cost": cost
+        }
+        with self._lock:
+            self._buffer.append(entry)
+            self._add(self._pending, entry)
+            due = (
+                len(self._buffer) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+        return cost
+
+    def flush(self):
+        """Append buffered entries in a single write"""
+        with self._lock:
+            if not self._buffer:
+                return
+            lines = "".join(json.dumps(e) + "\n" for e in self._buffer)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._buffer.clear()
+            self._last_flush = time.monotonic()
+        # Flushed entries now come back through the file tail instead
+        self._catch_up(reset_pending=True)
+
+    def _catch_up(self, reset_pending: bool = False):
+        """Fold entries appended since the last read (by any worker) into the totals"""
+        with self._lock:
+            if reset_pending:
+                self._pending = {}
+                for e in self._buffer:
+                    self._add(self._pending, e)
+            if not self.path.exists() or self.path.stat().st_size == self._offset:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # Another worker is mid-write; pick it up next time
+                    self._offset += len(line.encode("utf-8"))
+                    self._add(self._totals, json.loads(line))
+
+    def _add(self, totals: Dict[tuple, Dict[str, float]], entry: Dict[str, Any]):
+        bucket = totals.setdefault((entry["tenant"], entry["period"]), {"requests": 0, "cost": 0.0})
+        bucket["requests"] += 1
+        bucket["cost"] += entry["cost"]
+        for unit, amount in entry["units"].items():
+            bucket[unit] = bucket.get(unit, 0) + amount
+
+    def usage(self, tenant: str, period: Optional[str] = None) -> Dict[str, Any]:
+        """Totals for one tenant and period (default: this month)"""
+        self._catch_up()
+        key = (tenant, period or current_period())
+        with self._lock:
+            totals = dict(self._totals.get(key, {"requests": 0, "cost": 0.0}))
+            for unit, amount in self._pending.get(key, {}).items():
+                totals[unit] = totals.get(unit, 0) + amount
+        totals["cost"] = round(totals["cost"], 6)
+        budget = self.budget(tenant)
+        return {
+            "tenant": tenant,
+            "period": key[1],
+            **totals,
+            "budget": budget,
+            "remaining": None if budget is None else round(budget - totals["cost"], 6)
+        }
+
+    def budget(self, tenant: str) -> Optional[float]:
+        """Monthly budget in USD; "*" in RAG_TENANT_BUDGETS sets the default"""
+        budget = self.budgets.get(tenant, self.budgets.get("*"))
+        return float(budget) if budget is not None else None
+
+    def over_budget(self, tenant: str) -> bool:
+        budget = self.budget(tenant)
+        if budget is None:
+            return False
+        return self.usage(tenant)["cost"] >= budget
+
+
+__all__ = ['UsageLedger', 'BudgetExceeded', 'DEFAULT_TENANT', 'current_period']
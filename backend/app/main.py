@@ -3,24 +3,81 @@ RAG Application Backend - FastAPI
 Handles document ingestion, retrieval, reranking, and LLM answering
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator, Dict, Any
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
 import time
 import os
 import uuid
 from dotenv import load_dotenv
 
 from .rag_engine import RAGEngine
-from .models import QueryRequest, QueryResponse, IngestRequest, IngestResponse
+from .scheduler import Overloaded
+from .ledger import BudgetExceeded, DEFAULT_TENANT
+from .diagnostics import DIAGNOSTICS_ENABLED, PROFILE_ENDPOINTS, loop_monitor, profiler
+from .models import QueryRequest, QueryResponse, IngestRequest, IngestResponse, Citation, NAMESPACE_PATTERN
 
 load_dotenv()
 
+# RAG Engine is built in the background on startup (see lifespan below)
+rag_engine = None
+_engine_task: Optional[asyncio.Task] = None
+engine_state = {
+    "status": "cold",  # cold -> warming -> ready | failed
+    "startup_time_ms": None,
+    "error": None
+}
+
+
+def _build_engine() -> RAGEngine:
+    """Construct and warm up the engine (blocking, runs in a worker thread)"""
+    engine = RAGEngine()
+    engine.warm_up()
+    return engine
+
+
+async def _start_engine():
+    """Build the engine off the event loop and record readiness"""
+    global rag_engine
+    engine_state["status"] = "warming"
+    engine_state["error"] = None
+    start_time = time.time()
+    try:
+        rag_engine = await asyncio.to_thread(_build_engine)
+        engine_state["status"] = "ready"
+    except Exception as e:
+        engine_state["status"] = "failed"
+        engine_state["error"] = str(e)
+    finally:
+        engine_state["startup_time_ms"] = round((time.time() - start_time) * 1000, 2)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Kick off engine warm-up without blocking the server from accepting requests"""
+    global _engine_task
+    if DIAGNOSTICS_ENABLED:
+        loop_monitor.start()
+    if os.getenv("RAG_WARMUP", "1") != "0":
+        _engine_task = asyncio.create_task(_start_engine())
+    yield
+    if DIAGNOSTICS_ENABLED:
+        loop_monitor.stop()
+    if rag_engine is not None:
+        rag_engine.ledger.flush()
+
+
 app = FastAPI(
     title="RAG Application API",
     description="Retrieval-Augmented Generation with citations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS for frontend
@@ -32,16 +89,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Lazy initialize RAG Engine
-rag_engine = None
+if DIAGNOSTICS_ENABLED:
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next):
+        """Sample stacks while requests to the chosen endpoints are running"""
+        endpoint = request.url.path
+        if endpoint not in PROFILE_ENDPOINTS:
+            return await call_next(request)
+        profiler.begin(endpoint)
+        try:
+            return await call_next(request)
+        finally:
+            profiler.end(endpoint)
 
-def get_rag_engine():
-    global rag_engine
+
+async def get_rag_engine() -> RAGEngine:
+    """
+    Return the engine, waiting for the startup warm-up if it is still running.
+    Falls back to building it on demand when warm-up was disabled or failed.
+    """
+    global _engine_task
     if rag_engine is None:
-        rag_engine = RAGEngine()
+        if _engine_task is None or _engine_task.done():
+            _engine_task = asyncio.create_task(_start_engine())
+        await asyncio.shield(_engine_task)
+    if rag_engine is None:
+        raise RuntimeError(f"RAG engine failed to initialize: {engine_state['error']}")
     return rag_engine
 
 
+def get_tenant(
+    x_tenant_id: Optional[str] = Header(default=None),
+    x_api_key: Optional[str] = Header(default=None)
+) -> str:
+    """Tenant for usage accounting: X-Tenant-ID, else a hash of X-API-Key"""
+    if x_tenant_id:
+        return x_tenant_id
+    if x_api_key:
+        return "key_" + hashlib.sha256(x_api_key.encode()).hexdigest()[:12]
+    return DEFAULT_TENANT
+
+
+def tenant_namespace(tenant: str, namespace: str) -> str:
+    """
+    Index namespace behind a tenant's namespace, so callers only reach their own
+    partitions. Anonymous callers keep unprefixed names (including the original
+    default namespace); "." is outside NAMESPACE_PATTERN, so the two never collide.
+    """
+    if tenant == DEFAULT_TENANT:
+        return namespace
+    return f"t{hashlib.sha256(tenant.encode()).hexdigest()[:12]}.{namespace}"
+
+
+def get_namespace(
+    namespace: str = Query(default="", pattern=NAMESPACE_PATTERN),
+    tenant: str = Depends(get_tenant)
+) -> str:
+    """?namespace= resolved within the calling tenant"""
+    return tenant_namespace(tenant, namespace)
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    """Map a rejected provider call to 503 so clients back off instead of retrying hot"""
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @app.get("/")
 async def root():
     return {"status": "healthy", "message": "RAG API is running"}
@@ -49,11 +165,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "ready": engine_state["status"] == "ready",
+        "engine": engine_state["status"],
+        "startup_time_ms": engine_state["startup_time_ms"],
+        "init_timings_ms": rag_engine.init_timings if rag_engine else {},
+        "error": engine_state["error"]
+    }
 
 
 @app.post("/ingest", response_model=IngestResponse)
-async def ingest_document(request: IngestRequest):
+async def ingest_document(request: IngestRequest, tenant: str = Depends(get_tenant)):
     """
     Ingest text content into the vector database.
     Chunks the text, generates embeddings, and stores with metadata.
@@ -64,10 +187,13 @@ async def ingest_document(request: IngestRequest):
         # Generate unique source ID if not provided to prevent overwrites
         source = request.source or f"user_input_{uuid.uuid4().hex[:8]}"
         
-        result = await get_rag_engine().ingest_text(
+        engine = await get_rag_engine()
+        result = await engine.ingest_text(
             text=request.text,
             source=source,
-            title=request.title or "Untitled Document"
+            title=request.title or "Untitled Document",
+            tenant=tenant,
+            namespace=tenant_namespace(tenant, request.namespace)
         )
         
         processing_time = time.time() - start_time
@@ -76,8 +202,14 @@ async def ingest_document(request: IngestRequest):
             success=True,
             message=f"Successfully ingested {result['chunks_count']} chunks",
             chunks_count=result['chunks_count'],
-            processing_time_ms=round(processing_time * 1000, 2)
+            processing_time_ms=round(processing_time * 1000, 2),
+            cost_estimate=result.get('cost_estimate', 0.0),
+            cpu_time_ms=result.get('cpu_time_ms') if DIAGNOSTICS_ENABLED else None
         )
+    except Overloaded as e:
+        raise _overloaded(e)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=402, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -85,7 +217,9 @@ async def ingest_document(request: IngestRequest):
 @app.post("/ingest/file")
 async def ingest_file(
     file: UploadFile = File(...),
-    title: Optional[str] = None
+    title: Optional[str] = None,
+    namespace: str = Depends(get_namespace),
+    tenant: str = Depends(get_tenant)
 ):
     """
     Ingest a text file into the vector database.
@@ -100,10 +234,13 @@ async def ingest_file(
         # Add unique ID to filename to prevent overwrites when uploading same file multiple times
         unique_source = f"{filename}_{uuid.uuid4().hex[:8]}"
         
-        result = await get_rag_engine().ingest_text(
+        engine = await get_rag_engine()
+        result = await engine.ingest_text(
             text=text,
             source=unique_source,
-            title=title or filename
+            title=title or filename,
+            tenant=tenant,
+            namespace=namespace
         )
         
         processing_time = time.time() - start_time
@@ -112,14 +249,20 @@ async def ingest_file(
             success=True,
             message=f"Successfully ingested {result['chunks_count']} chunks from {file.filename}",
             chunks_count=result['chunks_count'],
-            processing_time_ms=round(processing_time * 1000, 2)
+            processing_time_ms=round(processing_time * 1000, 2),
+            cost_estimate=result.get('cost_estimate', 0.0),
+            cpu_time_ms=result.get('cpu_time_ms') if DIAGNOSTICS_ENABLED else None
         )
+    except Overloaded as e:
+        raise _overloaded(e)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=402, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/query", response_model=QueryResponse)
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, tenant: str = Depends(get_tenant)):
     """
     Query the RAG system:
     1. Retrieve relevant chunks from vector DB
@@ -129,44 +272,174 @@ async def query(request: QueryRequest):
     start_time = time.time()
     
     try:
-        result = await get_rag_engine().query(
+        engine = await get_rag_engine()
+        result = await engine.query(
             query=request.query,
             top_k=request.top_k or 10,
-            rerank_top_k=request.rerank_top_k or 5
+            rerank_top_k=request.rerank_top_k or 5,
+            expand_query=bool(request.expand_query),
+            tenant=tenant,
+            namespace=tenant_namespace(tenant, request.namespace),
+            session_id=request.session_id
         )
         
         processing_time = time.time() - start_time
         
         return QueryResponse(
             answer=result['answer'],
-            citations=result['citations'],
+            citations=[Citation(**c) for c in result['citations']],
             sources=result['sources'],
             processing_time_ms=round(processing_time * 1000, 2),
             retrieval_time_ms=result['retrieval_time_ms'],
             rerank_time_ms=result['rerank_time_ms'],
             llm_time_ms=result['llm_time_ms'],
             tokens_used=result.get('tokens_used', {}),
-            cost_estimate=result.get('cost_estimate', 0.0)
+            cost_estimate=result.get('cost_estimate', 0.0),
+            cached=result.get('cached', False),
+            rewrite_time_ms=result.get('rewrite_time_ms', 0.0),
+            query_variants=result.get('query_variants', []),
+            cpu_time_ms=result.get('cpu_time_ms') if DIAGNOSTICS_ENABLED else None,
+            degraded=result.get('degraded', False),
+            candidates_count=result.get('candidates_count', 0),
+            early_exit=result.get('early_exit', False),
+            session_id=result.get('session_id'),
+            standalone_query=result.get('standalone_query'),
+            condense_time_ms=result.get('condense_time_ms', 0.0),
+            reused_chunks=result.get('reused_chunks', 0)
         )
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/usage")
+async def get_usage(period: Optional[str] = None, tenant: str = Depends(get_tenant)):
+    """Usage units, spend and remaining budget for the calling tenant (period: YYYY-MM)"""
+    try:
+        engine = await get_rag_engine()
+        return engine.ledger.usage(tenant, period)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.delete("/clear")
-async def clear_index():
-    """Clear all documents from the vector database."""
+async def clear_index(namespace: str = Depends(get_namespace)):
+    """Clear all documents in a namespace from the vector database."""
     try:
-        await get_rag_engine().clear_index()
+        engine = await get_rag_engine()
+        await engine.clear_index(namespace)
         return {"success": True, "message": "Index cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str, namespace: str = Depends(get_namespace)):
+    """
+    Delete one document (by its source id, as listed by /documents).
+    Its chunks stop appearing in results immediately; the vectors are
+    removed by background compaction.
+    """
+    try:
+        engine = await get_rag_engine()
+        deleted = await engine.delete_document(document_id, namespace)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if deleted is None:
+        raise HTTPException(status_code=404, detail=f"Document '{document_id}' not found")
+    return {"success": True, "message": f"Deleted {deleted} chunks", "chunks_count": deleted}
+
+
 @app.get("/stats")
-async def get_stats():
-    """Get statistics about the vector database."""
+async def get_stats(namespace: str = Depends(get_namespace)):
+    """Get statistics about one namespace of the vector database."""
     try:
-        stats = await get_rag_engine().get_stats()
+        engine = await get_rag_engine()
+        stats = await engine.get_stats(namespace)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _ndjson(records: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Stream records as newline-delimited JSON"""
+    async def body():
+        async for record in records:
+            yield json.dumps(record) + "\n"
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.get("/chunks")
+async def list_chunks(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    include_vectors: bool = False,
+    namespace: str = Depends(get_namespace)
+):
+    """
+    Stream stored chunks as NDJSON, one chunk per line.
+    The last line is {"next_cursor": ...}; pass it back as ?cursor= to resume.
+    Omit limit to stream the whole index.
+    """
+    try:
+        engine = await get_rag_engine()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return _ndjson(engine.iter_chunks(
+        cursor=cursor, limit=limit, include_vectors=include_vectors, namespace=namespace
+    ))
+
+
+@app.get("/documents")
+async def list_documents(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    namespace: str = Depends(get_namespace)
+):
+    """
+    Stream per-document summaries (chunk count, tokens, ingest time) as NDJSON
+    from the local manifest. Same cursor protocol as /chunks.
+    """
+    try:
+        engine = await get_rag_engine()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def records():
+        next_cursor = cursor
+        remaining = limit
+        while True:
+            page_size = 500 if remaining is None else min(500, remaining)
+            documents, next_cursor = engine.manifest.list_documents(next_cursor, page_size, namespace)
+            for document in documents:
+                yield document
+            if remaining is not None:
+                remaining -= len(documents)
+            if next_cursor is None or (remaining is not None and remaining <= 0):
+                break
+        yield {"next_cursor": next_cursor}
+    
+    return _ndjson(records())
+
+
+@app.get("/diagnostics")
+async def diagnostics():
+    """Event-loop lag stats and the stacks of recent stalls (RAG_DIAGNOSTICS=1 only)"""
+    if not DIAGNOSTICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Diagnostics are disabled; set RAG_DIAGNOSTICS=1")
+    return {
+        "loop": loop_monitor.stats(),
+        "profiled_endpoints": PROFILE_ENDPOINTS
+    }
+
+
+@app.get("/diagnostics/profile", response_class=PlainTextResponse)
+async def diagnostics_profile(endpoint: Optional[str] = None, reset: bool = False):
+    """
+    Sampled stacks in folded format, ready for flamegraph.pl or speedscope.
+    Filter with ?endpoint=/query; ?reset=true clears samples after reading.
+    """
+    if not DIAGNOSTICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Diagnostics are disabled; set RAG_DIAGNOSTICS=1")
+    return profiler.folded(endpoint, reset)
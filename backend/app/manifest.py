@@ -0,0 +1,189 @@
+"""
+Local document manifest
+Per-document summaries and the document -> chunk-id index, recorded at ingest
+time so listings and deletes never need vector queries. Deleted chunks are
+tombstoned here until compaction removes them from the vector store. Every
+row belongs to a namespace. Stored in SQLite next to the shared cache, so all
+workers on a host see the same manifest.
+"""
+
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import DATA_DIR
+
+
+class DocumentManifest:
+    """SQLite-backed table of ingested documents, one row per ingest"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else DATA_DIR / "manifest.db"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL DEFAULT '', "
+            "source TEXT, title TEXT, chunk_count INTEGER, "
+            "token_count INTEGER, char_count INTEGER, ingested_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_by_source ON documents (namespace, source)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "namespace TEXT NOT NULL DEFAULT '', id TEXT, source TEXT, "
+            "PRIMARY KEY (namespace, id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (namespace, source)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tombstones ("
+            "namespace TEXT NOT NULL DEFAULT '', id TEXT, deleted_at REAL, "
+            "PRIMARY KEY (namespace, id))"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (SQLite connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def record_document(
+        self,
+        source: str,
+        title: str,
+        chunk_count: int,
+        token_count: int,
+        char_count: int,
+        ingested_at: Optional[float] = None,
+        chunk_ids: Optional[List[str]] = None,
+        namespace: str = ""
+    ):
+        """
+        Add the summary (and, if given, the chunk ids) of one ingest. Ingesting
+        the same source again adds another row rather than replacing the first.
+        """
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO documents (namespace, source, title, chunk_count, token_count, char_count, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (namespace, source, title, chunk_count, token_count, char_count, ingested_at or time.time())
+        )
+        conn.commit()
+        if chunk_ids is not None:
+            self.record_chunks(((chunk_id, source) for chunk_id in chunk_ids), namespace)
+
+    def record_chunks(self, chunks: Iterable[Tuple[str, str]], namespace: str = ""):
+        """Index (chunk_id, source) pairs; re-added ids are no longer tombstoned"""
+        rows = [(namespace, chunk_id, source) for chunk_id, source in chunks]
+        conn = self._conn()
+        conn.executemany("INSERT OR REPLACE INTO chunks (namespace, id, source) VALUES (?, ?, ?)", rows)
+        conn.executemany(
+            "DELETE FROM tombstones WHERE namespace = ? AND id = ?",
+            [(r[0], r[1]) for r in rows]
+        )
+        conn.commit()
+
+    def chunk_ids(self, source: str, namespace: str = "") -> List[str]:
+        rows = self._conn().execute(
+            "SELECT id FROM chunks WHERE namespace = ? AND source = ?", (namespace, source)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def tombstone_document(self, source: str, namespace: str = "") -> int:
+        """
+        Logically delete a document: its chunk ids move to the tombstone table
+        and the document disappears from listings. Returns the chunk count.
+        """
+        conn = self._conn()
+        now = time.time()
+        ids = self.chunk_ids(source, namespace)
+        conn.executemany(
+            "INSERT OR REPLACE INTO tombstones (namespace, id, deleted_at) VALUES (?, ?, ?)",
+            [(namespace, chunk_id, now) for chunk_id in ids]
+        )
+        conn.execute("DELETE FROM chunks WHERE namespace = ? AND source = ?", (namespace, source))
+        conn.execute("DELETE FROM documents WHERE namespace = ? AND source = ?", (namespace, source))
+        conn.commit()
+        return len(ids)
+
+    def tombstones(self, namespace: str = "") -> Set[str]:
+        rows = self._conn().execute("SELECT id FROM tombstones WHERE namespace = ?", (namespace,))
+        return {r[0] for r in rows}
+
+    def tombstone_ratio(self, namespace: str = "") -> float:
+        """Share of a namespace's chunks still in the vector store that are logically deleted"""
+        conn = self._conn()
+        (dead,) = conn.execute("SELECT COUNT(*) FROM tombstones WHERE namespace = ?", (namespace,)).fetchone()
+        (live,) = conn.execute("SELECT COUNT(*) FROM chunks WHERE namespace = ?", (namespace,)).fetchone()
+        return dead / (dead + live) if dead else 0.0
+
+    def clear_tombstones(self, ids: List[str], namespace: str = ""):
+        """Forget tombstones whose vectors have been physically deleted"""
+        conn = self._conn()
+        conn.executemany(
+            "DELETE FROM tombstones WHERE namespace = ? AND id = ?",
+            [(namespace, i) for i in ids]
+        )
+        conn.commit()
+
+    def get_document(self, source: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT * FROM documents WHERE namespace = ? AND source = ? ORDER BY seq DESC LIMIT 1",
+            (namespace, source)
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_documents(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        namespace: str = ""
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Keyset-paginated listing in ingest order.
+        Returns (documents, next_cursor); next_cursor is None on the last page.
+        """
+        after = int(cursor) if cursor else 0
+        rows = self._conn().execute(
+            "SELECT * FROM documents WHERE namespace = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (namespace, after, limit + 1)
+        ).fetchall()
+        next_cursor = str(rows[limit - 1]["seq"]) if len(rows) > limit else None
+        return [self._row_to_dict(r) for r in rows[:limit]], next_cursor
+
+    def totals(self, namespace: str = "") -> Dict[str, int]:
+        """Ingests and tokens per document row; chunks from the chunk index, where shared ids count once"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(token_count), 0) FROM documents WHERE namespace = ?",
+            (namespace,)
+        ).fetchone()
+        (chunks,) = conn.execute("SELECT COUNT(*) FROM chunks WHERE namespace = ?", (namespace,)).fetchone()
+        return {"documents": row[0], "chunks": chunks, "tokens": row[1]}
+
+    def clear(self, namespace: str = ""):
+        conn = self._conn()
+        for table in ("documents", "chunks", "tombstones"):
+            conn.execute(f"DELETE FROM {table} WHERE namespace = ?", (namespace,))
+        conn.commit()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "source": row["source"],
+            "title": row["title"],
+            "chunk_count": row["chunk_count"],
+            "token_count": row["token_count"],
+            "char_count": row["char_count"],
+            "ingested_at": row["ingested_at"]
+        }
+
+
+__all__ = ['DocumentManifest']
@@ -2,15 +2,20 @@
 Pydantic models for request/response validation
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 
 
+# Namespaces partition the index, caches and stats; "" is the default namespace
+NAMESPACE_PATTERN = r"^[A-Za-z0-9_-]{0,64}$"
+
+
 class IngestRequest(BaseModel):
     """Request model for text ingestion"""
     text: str
-    source: Optional[str] = "user_input"
+    source: Optional[str] = None  # Generated per ingest when omitted
     title: Optional[str] = "Untitled Document"
+    namespace: str = Field(default="", pattern=NAMESPACE_PATTERN)
 
 
 class IngestResponse(BaseModel):
@@ -19,6 +24,8 @@ class IngestResponse(BaseModel):
     message: str
     chunks_count: int
     processing_time_ms: float
+    cost_estimate: float = 0.0
+    cpu_time_ms: Optional[Dict[str, float]] = None  # Loop-thread CPU per stage, keyed like the *_time_ms fields (diagnostics mode)
 
 
 class Citation(BaseModel):
@@ -37,6 +44,9 @@ class QueryRequest(BaseModel):
     query: str
     top_k: Optional[int] = 10
     rerank_top_k: Optional[int] = 5
+    expand_query: Optional[bool] = False  # Search with several rewrites of the query
+    namespace: str = Field(default="", pattern=NAMESPACE_PATTERN)
+    session_id: Optional[str] = Field(default=None, max_length=128)  # Conversation to continue; omit for a one-off query
 
 
 class QueryResponse(BaseModel):
@@ -50,16 +60,14 @@ class QueryResponse(BaseModel):
     llm_time_ms: float
     tokens_used: Dict[str, int]
     cost_estimate: float
-
-
-class ChunkMetadata(BaseModel):
-    """Metadata stored with each chunk in vector DB"""
-    source: str
-    title: str
-    section: Optional[str] = None
-    position: int  # Position of chunk in document
-    chunk_index: int  # Index of chunk
-    total_chunks: int
-    char_start: int
-    char_end: int
-    text: str  # Store text for retrieval
+    cached: bool = False  # Served from the shared answer cache
+    rewrite_time_ms: float = 0.0
+    query_variants: List[str] = []  # Search strings used when expand_query is on
+    cpu_time_ms: Optional[Dict[str, float]] = None  # Loop-thread CPU per stage, keyed like the *_time_ms fields (diagnostics mode)
+    degraded: bool = False  # Answered on the cheaper over-budget path
+    candidates_count: int = 0  # Matches kept for rerank after score-based selection
+    early_exit: bool = False  # Best match scored below RAG_MIN_SCORE; rerank and LLM skipped
+    session_id: Optional[str] = None
+    standalone_query: Optional[str] = None  # Follow-up rewritten with the session history
+    condense_time_ms: float = 0.0
+    reused_chunks: int = 0  # Chunks whose rerank scores came from an earlier turn
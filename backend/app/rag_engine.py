@@ -5,16 +5,18 @@ Handles chunking, embeddings, vector storage, retrieval, reranking, and LLM answ
 
 import os
 import time
+import asyncio
 import hashlib
-from typing import List, Dict, Any, Optional
-import cohere
-from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
-from google import genai
-from google.genai import types
-import tiktoken
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Set, Tuple
 
-from .models import Citation, ChunkMetadata
+from .chunks import ChunkBatch
+from .cache import SharedCache, WriterLock, cache_key
+from .manifest import DocumentManifest
+from .ledger import UsageLedger, BudgetExceeded, DEFAULT_TENANT
+from .scheduler import ProviderScheduler, SingleFlight, PRIORITY_INGEST
+from .sessions import SessionStore, history_window
 
 
 class RAGEngine:
@@ -39,34 +41,126 @@ class RAGEngine:
     INDEX_NAME = "mini-rag"
     RERANK_MODEL = "rerank-v3.5"
     LLM_MODEL = "llama-3.3-70b-versatile"  # Groq model (updated)
+    EMBEDDING_BATCH_SIZE = 100  # Gemini batch embed limit per request
+    TOMBSTONE_COMPACTION_RATIO = float(os.getenv("RAG_TOMBSTONE_RATIO", "0.1"))
+    MAX_RESIDENT_NAMESPACES = int(os.getenv("RAG_MAX_RESIDENT_NAMESPACES", "64"))
+    DELETE_BATCH_SIZE = 1000  # Pinecone delete-by-id limit per request
+    
+    # Query rewriting / multi-query retrieval
+    QUERY_REWRITE_MODE = os.getenv("RAG_QUERY_REWRITE", "heuristic")  # "heuristic" or "llm"
+    REWRITE_MODEL = "llama-3.1-8b-instant"  # Cheap Groq model for rephrasing
+    MAX_QUERY_VARIANTS = 3  # Including the original query
+    RRF_K = 60  # Reciprocal rank fusion constant
+    
+    # Cheaper pipeline for tenants over budget: vector-score ordering instead
+    # of Cohere rerank, fewer context chunks and a shorter answer
+    DEGRADED_CONTEXT_CHUNKS = 2
+    DEGRADED_MAX_TOKENS = 256
+    
+    # Adaptive candidate selection from the vector score distribution;
+    # calibrate both with `python test_eval.py --calibrate`
+    MIN_RELEVANCE_SCORE = float(os.getenv("RAG_MIN_SCORE", "0"))  # Below this: no answer, skip rerank + LLM
+    SCORE_MARGIN = float(os.getenv("RAG_SCORE_MARGIN", "inf"))  # Drop matches trailing the best by more
+    # Conversation follow-ups: short questions or ones that lean on earlier turns
+    # are condensed into a standalone query before retrieval
+    FOLLOW_UP_PATTERN = r"\b(it|its|they|them|their|this|that|these|those|there|he|she|him|her)\b|^(and|also|what about|how about)\b"
+    FOLLOW_UP_MAX_WORDS = 4
+    QUERY_STOPWORDS = frozenset(
+        "a an the is are was were be do does did what which who whom how when where why "
+        "can could should would will of for to in on at by with from about and or my our "
+        "your their its this that these those i we you it me us".split()
+    )
     
     def __init__(self):
-        """Initialize connections to all services"""
+        """
+        Initialize connections to all services.
+
+        Provider SDKs are imported here rather than at module level so that
+        importing the app stays cheap; per-step timings end up in init_timings.
+        """
+        self.init_timings: Dict[str, float] = {}
+        
+        # Shared across worker processes on the same host
+        self.cache = SharedCache()
+        self.writer_lock = WriterLock()
+        self.manifest = DocumentManifest()
+        self.ledger = UsageLedger()
+        
+        # Per-namespace (corpus version, tombstoned chunk ids), most recently used
+        # last; cold namespaces are evicted and reloaded from the manifest on demand
+        self._namespaces: "OrderedDict[str, Tuple[int, Set[str]]]" = OrderedDict()
+        self._compaction_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Provider rate limits and in-flight query coalescing
+        self.scheduler = ProviderScheduler.from_env()
+        self.single_flight = SingleFlight()
+        
+        # Recent turns and reranked chunks per conversation
+        self.sessions = SessionStore(self.cache)
+        
+        self._init_clients()
+        self._init_tokenizer()
+    
+    def _record_init_time(self, step: str, start: float):
+        """Record how long an initialization step took"""
+        self.init_timings[step] = round((time.time() - start) * 1000, 2)
+    
+    def _init_clients(self):
+        """Import provider SDKs and create their clients"""
         # Google Gemini for embeddings (FREE!)
+        start = time.time()
+        from google import genai
+        from google.genai import types
+        self.genai_types = types
         self.genai_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY") or "")
+        self._record_init_time("gemini_ms", start)
         
         # Cohere for reranking
+        start = time.time()
+        import cohere
         self.cohere_client = cohere.Client(api_key=os.getenv("COHERE_API_KEY") or "")
+        self._record_init_time("cohere_ms", start)
         
         # Groq for LLM
+        start = time.time()
+        from openai import OpenAI
         self.groq_client = OpenAI(
             api_key=os.getenv("GROQ_API_KEY") or "",
             base_url="https://api.groq.com/openai/v1"
         )
+        self._record_init_time("groq_ms", start)
         
         # Pinecone for vector storage
+        start = time.time()
+        from pinecone import Pinecone
         self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY") or "")
         self._ensure_index()
         self.index = self.pc.Index(self.INDEX_NAME)  # type: ignore
-        
-        # Tokenizer for chunking
+        self._record_init_time("pinecone_ms", start)
+    
+    def _init_tokenizer(self):
+        """Load the tokenizer used for chunking"""
+        start = time.time()
+        import tiktoken
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self._record_init_time("tokenizer_ms", start)
+    
+    def warm_up(self):
+        """
+        Exercise the tokenizer and the index connection once so the first
+        real request doesn't pay for BPE table setup or the TLS handshake.
+        """
+        start = time.time()
+        self.tokenizer.encode("warm up")
+        self.index.describe_index_stats()  # type: ignore
+        self._record_init_time("warm_up_ms", start)
     
     def _ensure_index(self):
         """Create Pinecone index if it doesn't exist"""
         existing_indexes = [idx.name for idx in self.pc.list_indexes()]
         
         if self.INDEX_NAME not in existing_indexes:
+            from pinecone import ServerlessSpec
             self.pc.create_index(
                 name=self.INDEX_NAME,
                 dimension=self.EMBEDDING_DIMENSIONS,
@@ -77,14 +171,13 @@ class RAGEngine:
                 )
             )
             # Wait for index to be ready
-            import time
             time.sleep(10)
     
     def _count_tokens(self, text: str) -> int:
         """Count tokens in text"""
         return len(self.tokenizer.encode(text))
     
-    def _chunk_text(self, text: str, source: str, title: str) -> List[ChunkMetadata]:
+    def _chunk_text(self, text: str) -> ChunkBatch:
         """
         Chunk text into overlapping segments.
         
@@ -92,69 +185,50 @@ class RAGEngine:
         - Target chunk size: 1000 tokens
         - Overlap: 100 tokens (10%)
         - Split on sentence boundaries when possible
-        - Preserve metadata for citations
+        - Chunks are spans of the source text; metadata is added at upsert
         """
-        chunks = []
+        import re
         
         # Clean and normalize text
         text = text.strip()
+        chunks = ChunkBatch(text)
         if not text:
             return chunks
         
-        # Split into sentences (simple heuristic)
-        sentences = self._split_into_sentences(text)
-        
-        current_chunk = []
+        # Token counts of sentence pieces, reused when computing overlap
+        piece_tokens: Dict[int, int] = {}
+        current_chunk: List[int] = []  # Piece indices, always contiguous
         current_tokens = 0
-        chunk_index = 0
-        char_position = 0
         
-        for sentence in sentences:
+        for sentence_start, sentence_end in self._split_into_sentences(text):
+            sentence = text[sentence_start:sentence_end]
             sentence_tokens = self._count_tokens(sentence)
+            chunks.source_tokens += sentence_tokens
             
             # If single sentence exceeds chunk size, split it
             if sentence_tokens > self.CHUNK_SIZE:
                 # Save current chunk if exists
                 if current_chunk:
-                    chunk_text = " ".join(current_chunk)
-                    chunks.append(self._create_chunk_metadata(
-                        text=chunk_text,
-                        source=source,
-                        title=title,
-                        position=chunk_index,
-                        char_start=char_position - len(chunk_text),
-                        char_end=char_position
-                    ))
-                    chunk_index += 1
+                    chunks.add_chunk(current_chunk[0], current_chunk[-1] + 1, current_tokens)
                     current_chunk = []
                     current_tokens = 0
                 
-                # Split long sentence
-                words = sentence.split()
-                temp_chunk = []
+                # Split long sentence into word pieces
+                temp_chunk: List[int] = []
                 temp_tokens = 0
                 
-                for word in words:
-                    word_tokens = self._count_tokens(word + " ")
-                    if temp_tokens + word_tokens > self.CHUNK_SIZE:
-                        chunk_text = " ".join(temp_chunk)
-                        chunks.append(self._create_chunk_metadata(
-                            text=chunk_text,
-                            source=source,
-                            title=title,
-                            position=chunk_index,
-                            char_start=char_position,
-                            char_end=char_position + len(chunk_text)
-                        ))
-                        char_position += len(chunk_text) + 1
-                        chunk_index += 1
+                for word_match in re.finditer(r"\S+", sentence):
+                    word_tokens = self._count_tokens(word_match.group() + " ")
+                    piece = chunks.add_piece(sentence_start + word_match.start(), sentence_start + word_match.end())
+                    if temp_tokens + word_tokens > self.CHUNK_SIZE and temp_chunk:
+                        chunks.add_chunk(temp_chunk[0], temp_chunk[-1] + 1, temp_tokens)
                         
                         # Keep overlap
                         overlap_words = temp_chunk[-10:] if len(temp_chunk) > 10 else []
-                        temp_chunk = overlap_words + [word]
-                        temp_tokens = self._count_tokens(" ".join(temp_chunk))
+                        temp_chunk = overlap_words + [piece]
+                        temp_tokens = self._count_tokens(" ".join(chunks.piece(p) for p in temp_chunk))
                     else:
-                        temp_chunk.append(word)
+                        temp_chunk.append(piece)
                         temp_tokens += word_tokens
                 
                 if temp_chunk:
@@ -162,85 +236,51 @@ class RAGEngine:
                     current_tokens = temp_tokens
                 continue
             
+            piece = chunks.add_piece(sentence_start, sentence_end)
+            piece_tokens[piece] = sentence_tokens
+            
             # Check if adding sentence exceeds chunk size
             if current_tokens + sentence_tokens > self.CHUNK_SIZE:
                 # Save current chunk
-                chunk_text = " ".join(current_chunk)
-                chunks.append(self._create_chunk_metadata(
-                    text=chunk_text,
-                    source=source,
-                    title=title,
-                    position=chunk_index,
-                    char_start=char_position,
-                    char_end=char_position + len(chunk_text)
-                ))
-                char_position += len(chunk_text) + 1
-                chunk_index += 1
+                chunks.add_chunk(current_chunk[0], current_chunk[-1] + 1, current_tokens)
                 
                 # Start new chunk with overlap
                 overlap_tokens = 0
-                overlap_sentences = []
-                for s in reversed(current_chunk):
-                    s_tokens = self._count_tokens(s)
-                    if overlap_tokens + s_tokens <= self.CHUNK_OVERLAP:
-                        overlap_sentences.insert(0, s)
-                        overlap_tokens += s_tokens
+                overlap_start = len(current_chunk)
+                for i in range(len(current_chunk) - 1, -1, -1):
+                    p = current_chunk[i]
+                    if p not in piece_tokens:
+                        piece_tokens[p] = self._count_tokens(chunks.piece(p))
+                    if overlap_tokens + piece_tokens[p] <= self.CHUNK_OVERLAP:
+                        overlap_start = i
+                        overlap_tokens += piece_tokens[p]
                     else:
                         break
                 
-                current_chunk = overlap_sentences + [sentence]
+                current_chunk = current_chunk[overlap_start:] + [piece]
                 current_tokens = overlap_tokens + sentence_tokens
             else:
-                current_chunk.append(sentence)
+                current_chunk.append(piece)
                 current_tokens += sentence_tokens
         
         # Don't forget the last chunk
         if current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunks.append(self._create_chunk_metadata(
-                text=chunk_text,
-                source=source,
-                title=title,
-                position=chunk_index,
-                char_start=char_position,
-                char_end=char_position + len(chunk_text)
-            ))
-        
-        # Update total_chunks count
-        total = len(chunks)
-        for chunk in chunks:
-            chunk.total_chunks = total
+            chunks.add_chunk(current_chunk[0], current_chunk[-1] + 1, current_tokens)
         
         return chunks
     
-    def _split_into_sentences(self, text: str) -> List[str]:
-        """Split text into sentences"""
+    def _split_into_sentences(self, text: str) -> List[Tuple[int, int]]:
+        """Split stripped text into sentences, as (start, end) offsets"""
         import re
-        # Simple sentence splitting
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        return [s.strip() for s in sentences if s.strip()]
-    
-    def _create_chunk_metadata(
-        self,
-        text: str,
-        source: str,
-        title: str,
-        position: int,
-        char_start: int,
-        char_end: int
-    ) -> ChunkMetadata:
-        """Create chunk metadata object"""
-        return ChunkMetadata(
-            source=source,
-            title=title,
-            section=None,
-            position=position,
-            chunk_index=position,
-            total_chunks=0,  # Updated later
-            char_start=char_start,
-            char_end=char_end,
-            text=text
-        )
+        # Simple sentence splitting; the separators are kept so offsets can be summed
+        parts = re.split(r'((?<=[.!?])\s+)', text)
+        spans = []
+        position = 0
+        for i, part in enumerate(parts):
+            if i % 2 == 0 and part:
+                spans.append((position, position + len(part)))
+            position += len(part)
+        return spans
     
     def _generate_chunk_id(self, source: str, position: int, text: str) -> str:
         """Generate unique ID for a chunk based on source, position, and content hash"""
@@ -249,85 +289,344 @@ class RAGEngine:
         return hashlib.md5(content.encode()).hexdigest()
     
     async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for texts using Google Gemini (FREE!)"""
+        """
+        Generate embeddings for texts using Google Gemini (FREE!)
+        Texts are sent in batches, each batch costing one request against the
+        Gemini rate limit at ingest priority (queries go first).
+        """
         embeddings = []
-        for text in texts:
-            result = self.genai_client.models.embed_content(
+        for i in range(0, len(texts), self.EMBEDDING_BATCH_SIZE):
+            batch = texts[i:i + self.EMBEDDING_BATCH_SIZE]
+            result = await self.scheduler.call(
+                "gemini",
+                self.genai_client.models.embed_content,
                 model=self.EMBEDDING_MODEL,
-                contents=text,
-                config=types.EmbedContentConfig(
+                contents=batch,
+                config=self.genai_types.EmbedContentConfig(
                     task_type="RETRIEVAL_DOCUMENT",
                     output_dimensionality=self.EMBEDDING_DIMENSIONS
-                )
+                ),
+                priority=PRIORITY_INGEST
             )
-            embeddings.append(result.embeddings[0].values)
+            embeddings.extend(e.values for e in result.embeddings)
         return embeddings
     
-    async def _get_query_embedding(self, text: str) -> List[float]:
-        """Generate embedding for query using Google Gemini"""
-        result = self.genai_client.models.embed_content(
-            model=self.EMBEDDING_MODEL,
-            contents=text,
-            config=types.EmbedContentConfig(
-                task_type="RETRIEVAL_QUERY",
-                output_dimensionality=self.EMBEDDING_DIMENSIONS
+    async def _get_query_embeddings(
+        self,
+        texts: List[str],
+        units: Optional[Dict[str, float]] = None,
+        cpu_timings: Optional[Dict[str, float]] = None
+    ) -> List[List[float]]:
+        """
+        Embed one or more query strings, cached across workers.
+        Cache misses are embedded together in a single Gemini request, and
+        their tokens are added to units["embed_tokens"] if units is given.
+        """
+        with self._cpu_section(cpu_timings, "embedding"):
+            keys = [cache_key(self.EMBEDDING_MODEL, self.EMBEDDING_DIMENSIONS, t) for t in texts]
+            embeddings = [self.cache.get("query_embedding", k) for k in keys]
+            missing = [i for i, e in enumerate(embeddings) if e is None]
+        
+        if missing:
+            result = await self.scheduler.call(
+                "gemini",
+                self.genai_client.models.embed_content,
+                model=self.EMBEDDING_MODEL,
+                contents=[texts[i] for i in missing],
+                config=self.genai_types.EmbedContentConfig(
+                    task_type="RETRIEVAL_QUERY",
+                    output_dimensionality=self.EMBEDDING_DIMENSIONS
+                )
             )
+            with self._cpu_section(cpu_timings, "embedding"):
+                for i, e in zip(missing, result.embeddings):
+                    embeddings[i] = list(e.values)
+                    self.cache.set("query_embedding", keys[i], embeddings[i])
+                if units is not None:
+                    units["embed_tokens"] = units.get("embed_tokens", 0) + sum(
+                        self._count_tokens(texts[i]) for i in missing
+                    )
+        return embeddings  # type: ignore
+    
+    async def _rewrite_query(
+        self,
+        query: str,
+        units: Optional[Dict[str, float]] = None,
+        cpu_timings: Optional[Dict[str, float]] = None
+    ) -> List[str]:
+        """
+        Produce up to MAX_QUERY_VARIANTS search strings, the original first.
+        Uses a cheap LLM call when QUERY_REWRITE_MODE is "llm", falling back
+        to heuristic rewrites if that fails or the provider is saturated.
+        """
+        variants = [query]
+        if self.QUERY_REWRITE_MODE == "llm":
+            try:
+                variants += await self._llm_query_variants(query, units)
+            except Exception:
+                variants += self._heuristic_query_variants(query)
+        else:
+            with self._cpu_section(cpu_timings, "rewrite"):
+                variants += self._heuristic_query_variants(query)
+        
+        # Drop duplicates (case-insensitive) while keeping order
+        with self._cpu_section(cpu_timings, "rewrite"):
+            seen = set()
+            unique = []
+            for v in variants:
+                key = v.strip().lower()
+                if key and key not in seen:
+                    seen.add(key)
+                    unique.append(v.strip())
+        return unique[:self.MAX_QUERY_VARIANTS]
+    
+    async def _condense_query(
+        self,
+        query: str,
+        history: List[Dict[str, Any]],
+        units: Optional[Dict[str, float]] = None
+    ) -> str:
+        """
+        Rewrite a follow-up as a standalone question using the recent turns.
+        Questions that don't look like follow-ups are used as they are; if the
+        rewrite fails, the previous standalone question is prepended instead.
+        """
+        import re
+        if not history:
+            return query
+        if len(query.split()) > self.FOLLOW_UP_MAX_WORDS and not re.search(self.FOLLOW_UP_PATTERN, query, flags=re.IGNORECASE):
+            return query
+        
+        transcript = "\n".join(f"User: {t['query']}\nAssistant: {t['answer']}" for t in history)
+        try:
+            response = await self.scheduler.call(
+                "groq",
+                self.groq_client.chat.completions.create,
+                model=self.REWRITE_MODEL,
+                messages=[
+                    {"role": "system", "content": "Rewrite the user's last message as a standalone question for a "
+                     "document search engine. Use the conversation only to resolve what it refers to. "
+                     "Return the question alone, with no commentary."},
+                    {"role": "user", "content": f"Conversation:\n{transcript}\n\nLast message: {query}"}
+                ],
+                temperature=0,
+                max_tokens=96
+            )
+            self._add_rewrite_usage(response, units)
+            condensed = (response.choices[0].message.content or "").strip()
+        except Exception:
+            condensed = ""
+        return condensed or f"{history[-1]['standalone_query']} {query}"
+    
+    def _heuristic_query_variants(self, query: str) -> List[str]:
+        """
+        Cheap rewrites without an API call:
+        - declarative form: "What is the X of Y?" -> "the X of Y"
+        - keyword form: content words only
+        """
+        import re
+        stripped = query.strip().rstrip("?.! ")
+        declarative = re.sub(
+            r"^(what|which|who|how|when|where|why)(\s+(much|many|long|often))?(\s+(is|are|was|were|do|does|did|can|should))?\s+",
+            "",
+            stripped,
+            flags=re.IGNORECASE
+        )
+        words = re.findall(r"[\w$%&.-]+", stripped.lower())
+        keywords = " ".join(w for w in words if w not in self.QUERY_STOPWORDS)
+        return [declarative, keywords]
+    
+    async def _llm_query_variants(self, query: str, units: Optional[Dict[str, float]] = None) -> List[str]:
+        """Ask a small, fast model for alternative phrasings, one per line"""
+        response = await self.scheduler.call(
+            "groq",
+            self.groq_client.chat.completions.create,
+            model=self.REWRITE_MODEL,
+            messages=[
+                {"role": "system", "content": "Rewrite the user's search question for a document search engine. "
+                 f"Return {self.MAX_QUERY_VARIANTS - 1} alternative phrasings that spell out implied terms, "
+                 "one per line, with no numbering or commentary."},
+                {"role": "user", "content": query}
+            ],
+            temperature=0.3,
+            max_tokens=128
         )
-        return result.embeddings[0].values
+        self._add_rewrite_usage(response, units)
+        content = response.choices[0].message.content or ""
+        return [line.strip("-*0123456789. ") for line in content.splitlines() if line.strip()]
+    
+    def _add_rewrite_usage(self, response: Any, units: Optional[Dict[str, float]]):
+        """Add the tokens of a REWRITE_MODEL call to units, if given"""
+        usage = getattr(response, "usage", None)
+        if units is None or usage is None:
+            return
+        units["rewrite_prompt_tokens"] = units.get("rewrite_prompt_tokens", 0) + usage.prompt_tokens
+        units["rewrite_completion_tokens"] = units.get("rewrite_completion_tokens", 0) + usage.completion_tokens
+    
+    def _fuse_results(self, ranked_lists: List[List[Any]], top_k: int) -> List[Any]:
+        """Reciprocal rank fusion of several ranked match lists"""
+        scores: Dict[str, float] = {}
+        best: Dict[str, Any] = {}
+        for matches in ranked_lists:
+            for rank, match in enumerate(matches):
+                scores[match.id] = scores.get(match.id, 0.0) + 1.0 / (self.RRF_K + rank + 1)
+                if match.id not in best or match.score > best[match.id].score:
+                    best[match.id] = match
+        order = sorted(scores, key=scores.get, reverse=True)  # type: ignore
+        return [best[i] for i in order[:top_k]]
     
     async def ingest_text(
         self,
         text: str,
         source: str,
-        title: str
+        title: str,
+        tenant: str = DEFAULT_TENANT,
+        namespace: str = ""
     ) -> Dict[str, Any]:
         """
-        Ingest text into vector database:
+        Ingest text into vector database (within one namespace):
         1. Chunk the text
         2. Generate embeddings
         3. Upsert to Pinecone with metadata
         """
+        # Embedding is the whole cost of ingest, so there is nothing cheaper to fall back to
+        if self.ledger.over_budget(tenant):
+            raise BudgetExceeded(tenant)
+        
         # Chunk the text
-        chunks = self._chunk_text(text, source, title)
+        cpu_start = time.thread_time()
+        chunks = self._chunk_text(text)
+        chunk_texts = list(chunks.texts())
+        chunk_ids = [self._generate_chunk_id(source, i, t) for i, t in enumerate(chunk_texts)]
+        cpu_timings = {"chunking": time.thread_time() - cpu_start}
         
-        if not chunks:
-            return {"chunks_count": 0}
+        if not chunk_texts:
+            return {"chunks_count": 0, "cpu_time_ms": self._cpu_ms(cpu_timings)}
         
         # Generate embeddings
-        chunk_texts = [c.text for c in chunks]
         embeddings = await self._get_embeddings(chunk_texts)
         
-        # Prepare vectors for upsert
-        vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector_id = self._generate_chunk_id(source, chunk.position, chunk.text)
-            vectors.append({
-                "id": vector_id,
-                "values": embedding,
-                "metadata": {
-                    "source": chunk.source,
-                    "title": chunk.title,
-                    "section": chunk.section or "",
-                    "position": chunk.position,
-                    "chunk_index": chunk.chunk_index,
-                    "total_chunks": chunk.total_chunks,
-                    "text": chunk.text
-                }
-            })
-        
-        # Upsert to Pinecone (in batches of 100)
+        # Upsert to Pinecone (in batches of 100); one writer at a time across workers.
+        # Vector records are built one batch at a time to keep peak memory flat.
         batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)  # type: ignore
+        total = len(chunk_texts)
+        cpu_timings["upsert"] = 0.0
+        async with self.writer_lock.acquire():
+            for i in range(0, total, batch_size):
+                # Only building the records is timed; the upsert itself runs off the loop
+                cpu_start = time.thread_time()
+                batch = [
+                    {
+                        "id": chunk_ids[j],
+                        "values": embeddings[j],
+                        "metadata": {
+                            "source": source,
+                            "title": title,
+                            "section": "",
+                            "position": j,
+                            "chunk_index": j,
+                            "total_chunks": total,
+                            "text": chunk_texts[j]
+                        }
+                    }
+                    for j in range(i, min(i + batch_size, total))
+                ]
+                cpu_timings["upsert"] += time.thread_time() - cpu_start
+                await asyncio.to_thread(self.index.upsert, vectors=batch, namespace=namespace)  # type: ignore
+            
+            cpu_start = time.thread_time()
+            self.manifest.record_document(
+                source=source,
+                title=title,
+                chunk_count=total,
+                token_count=chunks.source_tokens,
+                char_count=len(text),
+                chunk_ids=chunk_ids,
+                namespace=namespace
+            )
+            self._on_corpus_changed(namespace)
+            cpu_timings["upsert"] += time.thread_time() - cpu_start
         
-        return {"chunks_count": len(chunks)}
+        self._maybe_compact(namespace)
+        cost = self.ledger.record(tenant, "ingest", {
+            "embed_tokens": sum(chunks.chunk_tokens)
+        })
+        return {
+            "chunks_count": total,
+            "cost_estimate": cost,
+            "cpu_time_ms": self._cpu_ms(cpu_timings)
+        }
+    
+    def _on_corpus_changed(self, namespace: str = ""):
+        """Publish a new corpus version so every worker stops serving stale answers"""
+        self.cache.bump_corpus_version(namespace)
+        self.cache.invalidate(f"answer:{namespace}")
+    
+    def _live_tombstones(self, namespace: str = "") -> Set[str]:
+        """
+        Tombstoned chunk ids for a namespace. Hot namespaces stay resident and
+        are only reloaded when their corpus version moves; the least recently
+        used ones are evicted past MAX_RESIDENT_NAMESPACES.
+        """
+        version = self.cache.corpus_version(namespace)
+        state = self._namespaces.get(namespace)
+        if state is None or state[0] != version:
+            state = (version, self.manifest.tombstones(namespace))
+            self._namespaces[namespace] = state
+        self._namespaces.move_to_end(namespace)
+        while len(self._namespaces) > self.MAX_RESIDENT_NAMESPACES:
+            self._namespaces.popitem(last=False)
+        return state[1]
+    
+    async def delete_document(self, source: str, namespace: str = "") -> Optional[int]:
+        """
+        Logically delete a document by tombstoning its chunk ids.
+        Costs O(chunks in the document); compaction starts right away to remove
+        the vectors from Pinecone, so a lost manifest can't resurrect them.
+        Returns the number of chunks deleted, or None if unknown.
+        """
+        async with self.writer_lock.acquire():
+            if self.manifest.get_document(source, namespace) is None:
+                return None
+            deleted = self.manifest.tombstone_document(source, namespace)
+            self._on_corpus_changed(namespace)
+        
+        self._maybe_compact(namespace, force=True)
+        return deleted
+    
+    def _maybe_compact(self, namespace: str = "", force: bool = False):
+        """Start background compaction once enough of a namespace is tombstoned (or at once with force)"""
+        task = self._compaction_tasks.get(namespace)
+        if task is not None and not task.done():
+            return
+        if force or self.manifest.tombstone_ratio(namespace) >= self.TOMBSTONE_COMPACTION_RATIO:
+            self._compaction_tasks[namespace] = asyncio.create_task(self.compact(namespace))
+    
+    async def compact(self, namespace: str = "") -> int:
+        """Physically delete a namespace's tombstoned vectors from Pinecone, in batches"""
+        removed = 0
+        try:
+            async with self.writer_lock.acquire():
+                ids = sorted(self.manifest.tombstones(namespace))
+                for i in range(0, len(ids), self.DELETE_BATCH_SIZE):
+                    batch = ids[i:i + self.DELETE_BATCH_SIZE]
+                    await asyncio.to_thread(self.index.delete, ids=batch, namespace=namespace)  # type: ignore
+                    self.manifest.clear_tombstones(batch, namespace)
+                    removed += len(batch)
+        finally:
+            # Tombstones left by a failed run are retried by the next ingest or delete
+            self._compaction_tasks.pop(namespace, None)
+        return removed
     
     async def query(
         self,
         query: str,
         top_k: int = 10,
-        rerank_top_k: int = 5
+        rerank_top_k: int = 5,
+        expand_query: bool = False,
+        tenant: str = DEFAULT_TENANT,
+        namespace: str = "",
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Query the RAG system:
@@ -335,77 +634,233 @@ class RAGEngine:
         2. Retrieve top-k from Pinecone
         3. Rerank with Cohere
         4. Generate answer with Groq LLM
+        
+        With expand_query, steps 1-2 run for several rewrites of the query and
+        the ranked lists are fused before the single rerank.
+        Identical queries already in flight share one pipeline run.
+        
+        Tenants over their budget get a cached full answer when one exists,
+        otherwise the degraded pipeline (no Cohere rerank, shorter context).
+        
+        With a session_id, follow-ups are first condensed into a standalone
+        query using a token-budgeted window of the session's history, and
+        chunks the session already had reranked are reused when they are
+        still the top candidates.
+        
+        Only the caller that ran the pipeline is billed for it; coalesced callers
+        ("query_coalesced") are billed like cache hits, for their own condense
+        call only, so the ledger matches real provider spend.
+        """
+        units: Dict[str, float] = {}
+        # Loop-thread CPU of this caller's own synchronous work (see _run_query)
+        cpu_timings: Dict[str, float] = {}
+        with self._cpu_section(cpu_timings, "bookkeeping"):
+            session_key = self.sessions.key(tenant, namespace, session_id) if session_id else None
+            session = self.sessions.get(session_key) if session_key else None
+        
+        # Step 0: Condense a follow-up into a standalone query
+        standalone_query = query
+        condense_time_ms = 0.0
+        if session and session["turns"]:
+            start = time.time()
+            with self._cpu_section(cpu_timings, "condense"):
+                history = history_window(session["turns"], self._count_tokens)
+            standalone_query = await self._condense_query(query, history, units)
+            condense_time_ms = round((time.time() - start) * 1000, 2)
+        
+        with self._cpu_section(cpu_timings, "bookkeeping"):
+            # Answers are only reusable for the namespace and corpus version they were computed on
+            version = self.cache.corpus_version(namespace)
+            answer_key = cache_key(standalone_query, top_k, rerank_top_k, expand_query, namespace, version)
+            degraded = self.ledger.over_budget(tenant)
+            keys = [answer_key]
+            if degraded:
+                answer_key = cache_key(standalone_query, top_k, rerank_top_k, expand_query, namespace, version, "degraded")
+                keys.append(answer_key)
+            # Runs that may reuse this session's rerank scores (from earlier, different
+            # queries) are cached and coalesced privately to the session
+            reusable = session["chunks"] if session else None
+            if reusable:
+                answer_key = cache_key(answer_key, session_key)
+                keys.append(answer_key)
+            
+            result = None
+            for key in keys:
+                cached = self.cache.get(f"answer:{namespace}", key)
+                if cached is not None:
+                    cached.update(retrieval_time_ms=0, rerank_time_ms=0, llm_time_ms=0, cpu_time_ms={}, cached=True)
+                    cached["cost_estimate"] = self.ledger.record(tenant, "query_cached", units)
+                    result = cached
+                    break
+        
+        if result is None:
+            led = False
+            
+            async def run_pipeline():
+                nonlocal led
+                led = True
+                return await self._run_query(
+                    standalone_query, top_k, rerank_top_k, expand_query, answer_key, degraded,
+                    namespace, reusable
+                )
+            
+            shared, pipeline_units = await self.single_flight.do(answer_key, run_pipeline)
+            # Coalesced callers each get their own copy
+            result = dict(shared)
+            with self._cpu_section(cpu_timings, "bookkeeping"):
+                if led:
+                    for unit, amount in pipeline_units.items():
+                        units[unit] = units.get(unit, 0) + amount
+                result["cost_estimate"] = self.ledger.record(tenant, "query" if led else "query_coalesced", units)
+        
+        if session_key:
+            with self._cpu_section(cpu_timings, "bookkeeping"):
+                self.sessions.add_turn(session_key, query, standalone_query, result["answer"], result["sources"])
+            result.update(
+                session_id=session_id,
+                standalone_query=standalone_query,
+                condense_time_ms=condense_time_ms
+            )
+        
+        # Coalesced callers only report their own bookkeeping on top of the shared run
+        cpu_ms = dict(result.get("cpu_time_ms") or {})
+        for stage, ms in self._cpu_ms(cpu_timings).items():
+            cpu_ms[stage] = round(cpu_ms.get(stage, 0.0) + ms, 2)
+        result["cpu_time_ms"] = cpu_ms
+        return result
+    
+    async def _run_query(
+        self,
+        query: str,
+        top_k: int,
+        rerank_top_k: int,
+        expand_query: bool,
+        answer_key: str,
+        degraded: bool,
+        namespace: str = "",
+        reusable: Optional[Dict[str, float]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Run the full retrieve -> rerank -> generate pipeline once.
+        Returns the response and its billable units; the caller bills them.
+        reusable maps chunk ids to rerank scores from earlier turns of the same session.
         """
         timings = {}
+        units: Dict[str, float] = {}
+        # Event-loop thread CPU per stage, for comparison with its *_time_ms.
+        # Only the synchronous sections of a stage are timed: other requests run
+        # on this thread while one awaits, so thread_time() across an await
+        # would count their work too
+        cpu_timings: Dict[str, float] = {}
+        
+        # Step 0 (optional): Rewrite the query into several search variants
+        variants = [query]
+        if expand_query:
+            start = time.time()
+            variants = await self._rewrite_query(query, units, cpu_timings)
+            timings['rewrite'] = time.time() - start
         
-        # Step 1: Embed query using Gemini
+        # Step 1: Embed all variants in one Gemini call
         start = time.time()
-        query_embedding = await self._get_query_embedding(query)
+        query_embeddings = await self._get_query_embeddings(variants, units, cpu_timings)
         timings['embedding'] = time.time() - start
         
-        # Step 2: Retrieve from Pinecone
+        # Step 2: Retrieve from Pinecone, then keep only the candidates whose
+        # scores are close enough to the best one to be worth reranking
         start = time.time()
-        results = self.index.query(  # type: ignore
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
+        matches = await self._search(query_embeddings, top_k, namespace, cpu_timings)
+        with self._cpu_section(cpu_timings, "retrieval"):
+            candidates = self._select_candidates(matches)
         timings['retrieval'] = time.time() - start
         retrieval_time_ms = round(timings['retrieval'] * 1000, 2)
         
-        # Check if we have results
-        if not results.matches:
-            return self._no_answer_response(timings)
+        # Check if we have results; a weak best match exits before rerank and LLM
+        if not candidates:
+            response = self._no_answer_response(timings, variants, cpu_timings)
+            response["early_exit"] = bool(matches)
+            return response, units
         
-        # Step 3: Rerank with Cohere
+        # Step 3: Rerank with Cohere (or keep vector order when degraded or
+        # when a single candidate is left). In a session, if the top candidates
+        # were all reranked on an earlier turn, their scores are reused.
         start = time.time()
-        documents = [match.metadata['text'] for match in results.matches]
-        
-        rerank_response = self.cohere_client.rerank(
-            model=self.RERANK_MODEL,
-            query=query,
-            documents=documents,
-            top_n=rerank_top_k
-        )
+        ranked = None
+        with self._cpu_section(cpu_timings, "rerank"):
+            top_candidates = sorted(candidates, key=lambda m: m.score, reverse=True)[:rerank_top_k]
+            reused = (
+                not degraded and len(candidates) > 1 and bool(reusable)
+                and all(m.id in reusable for m in top_candidates)  # type: ignore
+            )
+            if degraded:
+                ranked = [(match, match.score) for match in candidates[:self.DEGRADED_CONTEXT_CHUNKS]]
+            elif len(candidates) == 1:
+                ranked = [(candidates[0], candidates[0].score)]
+            elif reused:
+                ranked = sorted(
+                    ((m, reusable[m.id]) for m in top_candidates),  # type: ignore
+                    key=lambda pair: pair[1],
+                    reverse=True
+                )
+        if ranked is None:
+            documents = [match.metadata['text'] for match in candidates]
+            
+            rerank_response = await self.scheduler.call(
+                "cohere",
+                self.cohere_client.rerank,
+                model=self.RERANK_MODEL,
+                query=query,
+                documents=documents,
+                top_n=min(rerank_top_k, len(candidates))
+            )
+            units["rerank_searches"] = 1
+            ranked = [(candidates[r.index], r.relevance_score) for r in rerank_response.results]
         timings['rerank'] = time.time() - start
         rerank_time_ms = round(timings['rerank'] * 1000, 2)
         
         # Get reranked results
-        reranked_results = []
-        for result in rerank_response.results:
-            original_match = results.matches[result.index]
-            reranked_results.append({
-                "text": original_match.metadata['text'],
-                "source": original_match.metadata['source'],
-                "title": original_match.metadata['title'],
-                "section": original_match.metadata.get('section', ''),
-                "position": original_match.metadata['position'],
-                "relevance_score": result.relevance_score
-            })
+        with self._cpu_section(cpu_timings, "rerank"):
+            reranked_results = []
+            for original_match, relevance_score in ranked:
+                reranked_results.append({
+                    "id": original_match.id,
+                    "text": original_match.metadata['text'],
+                    "source": original_match.metadata['source'],
+                    "title": original_match.metadata['title'],
+                    "section": original_match.metadata.get('section', ''),
+                    "position": original_match.metadata['position'],
+                    "relevance_score": relevance_score
+                })
         
         # Step 4: Generate answer with LLM
         start = time.time()
-        answer, tokens_used = await self._generate_answer(query, reranked_results)
+        answer, tokens_used = await self._generate_answer(
+            query,
+            reranked_results,
+            max_tokens=self.DEGRADED_MAX_TOKENS if degraded else 1024,
+            cpu_timings=cpu_timings
+        )
         timings['llm'] = time.time() - start
         llm_time_ms = round(timings['llm'] * 1000, 2)
         
-        # Prepare citations
-        citations = []
-        for i, result in enumerate(reranked_results):
-            citations.append(Citation(
-                id=i + 1,
-                text=result['text'][:500] + "..." if len(result['text']) > 500 else result['text'],
-                source=result['source'],
-                title=result['title'],
-                section=result['section'] if result['section'] else None,
-                position=result['position'],
-                relevance_score=round(result['relevance_score'], 4)
-            ))
-        
-        # Calculate cost estimate
-        cost_estimate = self._estimate_cost(tokens_used)
+        # Prepare citations (plain dicts; the API layer turns them into models)
+        with self._cpu_section(cpu_timings, "llm"):
+            citations = []
+            for i, result in enumerate(reranked_results):
+                citations.append({
+                    "id": i + 1,
+                    "text": result['text'][:500] + "..." if len(result['text']) > 500 else result['text'],
+                    "source": result['source'],
+                    "title": result['title'],
+                    "section": result['section'] if result['section'] else None,
+                    "position": result['position'],
+                    "relevance_score": round(result['relevance_score'], 4)
+                })
         
-        return {
+        # Usage units; query() bills them to the caller that led this run
+        units["prompt_tokens"] = tokens_used.get('prompt_tokens', 0)
+        units["completion_tokens"] = tokens_used.get('completion_tokens', 0)
+        
+        response = {
             "answer": answer,
             "citations": citations,
             "sources": reranked_results,
@@ -413,23 +868,93 @@ class RAGEngine:
             "rerank_time_ms": rerank_time_ms,
             "llm_time_ms": llm_time_ms,
             "tokens_used": tokens_used,
-            "cost_estimate": cost_estimate
+            "rewrite_time_ms": round(timings.get('rewrite', 0) * 1000, 2),
+            "query_variants": variants,
+            "degraded": degraded,
+            "candidates_count": len(candidates),
+            "reused_chunks": len(ranked) if reused else 0
         }
+        with self._cpu_section(cpu_timings, "bookkeeping"):
+            self.cache.set(f"answer:{namespace}", answer_key, response)
+        response["cpu_time_ms"] = self._cpu_ms(cpu_timings)
+        return response, units
+    
+    async def _search(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int,
+        namespace: str = "",
+        cpu_timings: Optional[Dict[str, float]] = None
+    ) -> List[Any]:
+        """
+        One Pinecone search per query embedding (concurrently), over-fetching
+        to make up for deleted chunks; several result lists are fused with RRF.
+        """
+        with self._cpu_section(cpu_timings, "retrieval"):
+            tombstones = self._live_tombstones(namespace)
+        result_sets = await asyncio.gather(*(
+            asyncio.to_thread(
+                self.index.query,  # type: ignore
+                vector=embedding,
+                top_k=top_k + min(len(tombstones), top_k),
+                include_metadata=True,
+                namespace=namespace
+            )
+            for embedding in query_embeddings
+        ))
+        with self._cpu_section(cpu_timings, "retrieval"):
+            ranked_lists = [
+                [m for m in results.matches if m.id not in tombstones]
+                for results in result_sets
+            ]
+            if len(ranked_lists) == 1:
+                return ranked_lists[0][:top_k]
+            return self._fuse_results(ranked_lists, top_k)
+    
+    def _select_candidates(self, matches: List[Any]) -> List[Any]:
+        """
+        Size the rerank candidate set from the score distribution: matches
+        trailing the best one by more than SCORE_MARGIN are dropped, and
+        nothing is kept when the best score is below MIN_RELEVANCE_SCORE.
+        """
+        if not matches:
+            return []
+        best = max(m.score for m in matches)
+        if best < self.MIN_RELEVANCE_SCORE:
+            return []
+        floor = max(self.MIN_RELEVANCE_SCORE, best - self.SCORE_MARGIN)
+        return [m for m in matches if m.score >= floor]
+    
+    async def retrieve(
+        self,
+        query: str,
+        top_k: int = 10,
+        expand_query: bool = False,
+        namespace: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Retrieval only (no candidate selection, rerank or LLM): ranked matches with their vector scores"""
+        variants = await self._rewrite_query(query) if expand_query else [query]
+        query_embeddings = await self._get_query_embeddings(variants)
+        matches = await self._search(query_embeddings, top_k, namespace)
+        return [{"id": m.id, "score": m.score, **(m.metadata or {})} for m in matches]
     
     async def _generate_answer(
         self,
         query: str,
-        context_results: List[Dict[str, Any]]
+        context_results: List[Dict[str, Any]],
+        max_tokens: int = 1024,
+        cpu_timings: Optional[Dict[str, float]] = None
     ) -> tuple[str, Dict[str, int]]:
         """Generate answer using Groq LLM with citations"""
         
         # Build context string with citation markers
-        context_parts = []
-        for i, result in enumerate(context_results):
-            citation_num = i + 1
-            context_parts.append(f"[{citation_num}] {result['text']}")
-        
-        context = "\n\n".join(context_parts)
+        with self._cpu_section(cpu_timings, "llm"):
+            context_parts = []
+            for i, result in enumerate(context_results):
+                citation_num = i + 1
+                context_parts.append(f"[{citation_num}] {result['text']}")
+            
+            context = "\n\n".join(context_parts)
         
         system_prompt = """You are a helpful assistant that answers questions based on the provided context.
         
@@ -448,14 +973,16 @@ Question: {query}
 
 Please provide a comprehensive answer with inline citations [1], [2], etc. referring to the sources above."""
         
-        response = self.groq_client.chat.completions.create(
+        response = await self.scheduler.call(
+            "groq",
+            self.groq_client.chat.completions.create,
             model=self.LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.3,
-            max_tokens=1024
+            max_tokens=max_tokens
         )
         
         answer = response.choices[0].message.content or ""
@@ -468,7 +995,12 @@ Please provide a comprehensive answer with inline citations [1], [2], etc. refer
         
         return answer, tokens_used
     
-    def _no_answer_response(self, timings: Dict[str, float]) -> Dict[str, Any]:
+    def _no_answer_response(
+        self,
+        timings: Dict[str, float],
+        variants: Optional[List[str]] = None,
+        cpu_timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
         """Return response when no relevant documents found"""
         return {
             "answer": "I couldn't find any relevant information in the knowledge base to answer your question. Please try uploading relevant documents first or rephrasing your question.",
@@ -478,44 +1010,99 @@ Please provide a comprehensive answer with inline citations [1], [2], etc. refer
             "rerank_time_ms": 0,
             "llm_time_ms": 0,
             "tokens_used": {},
-            "cost_estimate": 0.0
+            "cost_estimate": 0.0,
+            "rewrite_time_ms": round(timings.get('rewrite', 0) * 1000, 2),
+            "query_variants": variants or [],
+            "cpu_time_ms": self._cpu_ms(cpu_timings or {})
         }
     
-    def _estimate_cost(self, tokens_used: Dict[str, int]) -> float:
+    @contextmanager
+    def _cpu_section(self, cpu_timings: Optional[Dict[str, float]], stage: str):
+        """Add the loop-thread CPU of a block with no awaits to cpu_timings[stage], if given"""
+        start = time.thread_time()
+        try:
+            yield
+        finally:
+            if cpu_timings is not None:
+                cpu_timings[stage] = cpu_timings.get(stage, 0.0) + time.thread_time() - start
+    
+    def _cpu_ms(self, cpu_timings: Dict[str, float]) -> Dict[str, float]:
         """
-        Estimate cost based on token usage.
-        Prices (approximate):
-        - OpenAI embedding: $0.00002/1K tokens
-        - Cohere rerank: $0.001/search
-        - Groq Llama 70B: $0.0007/1K input, $0.0008/1K output
+        Per-stage loop-thread CPU in ms. Query stages are keyed like their
+        *_time_ms fields (rewrite, retrieval, rerank, llm, condense); embedding
+        has no wall-time field, and bookkeeping is cache, ledger and session I/O.
+        Ingest reports chunking and upsert.
         """
-        cost = 0.0
-        
-        # Embedding cost (rough estimate)
-        cost += 0.00002  # Per query
-        
-        # Rerank cost
-        cost += 0.001
+        return {stage: round(seconds * 1000, 2) for stage, seconds in cpu_timings.items()}
+    
+    async def clear_index(self, namespace: str = ""):
+        """Delete all vectors in a namespace"""
+        async with self.writer_lock.acquire():
+            await asyncio.to_thread(self.index.delete, delete_all=True, namespace=namespace)  # type: ignore
+            self.manifest.clear(namespace)
+            self._on_corpus_changed(namespace)
+    
+    async def iter_chunks(
+        self,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        include_vectors: bool = False,
+        namespace: str = ""
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream stored chunks page by page using Pinecone's ID listing.
         
-        # LLM cost
-        if tokens_used:
-            input_cost = (tokens_used.get('prompt_tokens', 0) / 1000) * 0.0007
-            output_cost = (tokens_used.get('completion_tokens', 0) / 1000) * 0.0008
-            cost += input_cost + output_cost
+        Yields one dict per chunk, then a final {"next_cursor": ...} record;
+        pass that cursor back in to resume. Only one page is held in memory.
+        """
+        remaining = limit
+        while True:
+            page_size = 100 if remaining is None else min(100, remaining)
+            page = await asyncio.to_thread(
+                self.index.list_paginated,  # type: ignore
+                limit=page_size,
+                pagination_token=cursor,
+                namespace=namespace
+            )
+            listed = [v.id for v in page.vectors]
+            cursor = page.pagination.next if page.pagination else None
+            
+            tombstones = self._live_tombstones(namespace)
+            ids = [i for i in listed if i not in tombstones]
+            if ids:
+                fetched = await asyncio.to_thread(self.index.fetch, ids=ids, namespace=namespace)  # type: ignore
+                for vector_id in ids:
+                    vector = fetched.vectors.get(vector_id)
+                    if vector is None:
+                        continue
+                    record = {"id": vector_id, **(vector.metadata or {})}
+                    if include_vectors:
+                        record["values"] = list(vector.values)
+                    yield record
+            
+            if remaining is not None:
+                remaining -= len(listed)
+            if not cursor or (remaining is not None and remaining <= 0):
+                break
         
-        return round(cost, 6)
-    
-    async def clear_index(self):
-        """Delete all vectors from the index"""
-        self.index.delete(delete_all=True)  # type: ignore
+        yield {"next_cursor": cursor}
     
-    async def get_stats(self) -> Dict[str, Any]:
-        """Get index statistics"""
-        stats = self.index.describe_index_stats()  # type: ignore
+    async def get_stats(self, namespace: str = "") -> Dict[str, Any]:
+        """Get statistics for one namespace of the index"""
+        stats = await asyncio.to_thread(self.index.describe_index_stats)  # type: ignore
+        partition = (stats.namespaces or {}).get(namespace)
         return {
-            "total_vectors": stats.total_vector_count,
+            "namespace": namespace,
+            "total_vectors": partition.vector_count if partition else 0,
+            "index_vectors": stats.total_vector_count,
             "dimensions": self.EMBEDDING_DIMENSIONS,
-            "index_name": self.INDEX_NAME
+            "index_name": self.INDEX_NAME,
+            "corpus_version": self.cache.corpus_version(namespace),
+            "manifest": self.manifest.totals(namespace),
+            "tombstone_ratio": round(self.manifest.tombstone_ratio(namespace), 4),
+            "resident_namespaces": len(self._namespaces),
+            "active_sessions": len(self.sessions),
+            "provider_queues": self.scheduler.stats()
         }
 
 
@@ -0,0 +1,173 @@
+"""
+Admission control for external provider calls
+Token-bucket rate limits per provider, priority queueing (interactive queries
+ahead of ingest work), single-flight coalescing of identical requests, and
+fast rejection when the expected wait is too long.
+"""
+
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_INGEST = 1
+
+# Requests per minute on the free tiers (override with RAG_RPM_<PROVIDER>)
+DEFAULT_RPM = {
+    "gemini": 100,
+    "cohere": 10,
+    "groq": 30,
+}
+
+
+class Overloaded(Exception):
+    """Raised when a provider queue cannot admit a request in time"""
+
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(f"{provider} is at capacity, retry in {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        """Add the tokens accrued since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ProviderQueue:
+    """Rate-limited priority queue in front of a single provider"""
+
+    def __init__(self, name: str, rate_per_minute: float, burst: int, max_wait: float):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.max_wait = max_wait
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def expected_wait(self) -> float:
+        """Rough time until a newly queued request would be admitted"""
+        self.bucket.refill()
+        backlog = len(self._waiters) + 1 - self.bucket.tokens
+        return max(0.0, backlog / self.bucket.rate)
+
+    async def acquire(self, priority: int):
+        """Wait for a token, or raise Overloaded if the queue is too deep"""
+        wait = self.expected_wait()
+        if wait > self.max_wait:
+            raise Overloaded(self.name, math.ceil(wait))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Hand out tokens to waiters in priority order"""
+        while self._waiters:
+            # Skip callers that gave up while queued
+            if self._waiters[0][2].cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self.bucket.try_take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.cancelled():
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        self.bucket.refill()
+        return {
+            "queued": len(self._waiters),
+            "tokens": round(self.bucket.tokens, 2),
+            "rate_per_minute": round(self.bucket.rate * 60, 2)
+        }
+
+
+class ProviderScheduler:
+    """Routes blocking SDK calls through per-provider queues and a thread pool"""
+
+    def __init__(self, limits: Dict[str, float], max_wait: float = 30.0):
+        self.queues = {
+            name: ProviderQueue(name, rpm, burst=max(1, int(rpm // 4)), max_wait=max_wait)
+            for name, rpm in limits.items()
+        }
+
+    @classmethod
+    def from_env(cls) -> "ProviderScheduler":
+        """
+        RAG_RPM_* are budgets for the whole host. Buckets live in each worker
+        process, so every worker gets an equal share (WEB_CONCURRENCY workers);
+        a share left idle by one worker is not lent to the others.
+        """
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        limits = {
+            name: float(os.getenv(f"RAG_RPM_{name.upper()}", rpm)) / workers
+            for name, rpm in DEFAULT_RPM.items()
+        }
+        return cls(limits, max_wait=float(os.getenv("RAG_MAX_QUEUE_WAIT_S", "30")))
+
+    async def call(
+        self,
+        provider: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: int = PRIORITY_INTERACTIVE,
+        **kwargs: Any
+    ) -> Any:
+        """Wait for admission, then run the SDK call off the event loop"""
+        await self.queues[provider].acquire(priority)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: queue.stats() for name, queue in self.queues.items()}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller disconnecting doesn't cancel the others' result
+        return await asyncio.shield(task)
+
+
+__all__ = [
+    'ProviderScheduler', 'SingleFlight', 'Overloaded',
+    'PRIORITY_INTERACTIVE', 'PRIORITY_INGEST'
+]
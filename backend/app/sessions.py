@@ -0,0 +1,105 @@
+"""
+Conversation sessions
+Each session keeps its recent turns and the rerank scores of the chunks they
+were answered from, so follow-up questions can be condensed with the help of
+the history and can reuse rerank results for chunks that still rank well.
+Chunk texts are not kept; they come back with every vector search. Sessions live in a bounded
+in-process LRU and are written through to the shared cache, so a follow-up
+that lands on another worker still sees the latest turn.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+from .cache import SharedCache, cache_key
+
+
+MAX_SESSIONS = int(os.getenv("RAG_MAX_SESSIONS", "1000"))
+SESSION_TTL_S = float(os.getenv("RAG_SESSION_TTL_S", "1800"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("RAG_SESSION_HISTORY_TOKENS", "1000"))
+MAX_TURNS = 10  # Turns kept per session; their chunk scores form the reuse pool
+
+
+class SessionStore:
+    """Bounded LRU of sessions, keyed by tenant, namespace and client session id"""
+
+    def __init__(self, cache: SharedCache, max_sessions: int = MAX_SESSIONS, ttl: float = SESSION_TTL_S):
+        self.cache = cache
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def key(self, tenant: str, namespace: str, session_id: str) -> str:
+        """Sessions are private to the tenant and namespace that created them"""
+        return cache_key(tenant, namespace, session_id)
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """Return a session (a fresh one if unknown or expired)"""
+        session = self._sessions.get(key)
+        # Another worker may have answered the previous turn
+        shared = self.cache.get("session", key)
+        if shared is not None and (session is None or shared["updated_at"] > session["updated_at"]):
+            session = shared
+        if session is None or time.time() - session["updated_at"] > self.ttl:
+            session = {"turns": [], "chunks": {}, "updated_at": time.time()}
+        self._touch(key, session)
+        return session
+
+    def add_turn(
+        self,
+        key: str,
+        query: str,
+        standalone_query: str,
+        answer: str,
+        sources: List[Dict[str, Any]]
+    ):
+        """Append a turn and keep the {chunk_id: relevance_score} pool to the chunks of retained turns"""
+        session = self.get(key)
+        session["turns"].append({
+            "query": query,
+            "standalone_query": standalone_query,
+            "answer": answer,
+            "chunk_ids": [s["id"] for s in sources if "id" in s]
+        })
+        del session["turns"][:-MAX_TURNS]
+
+        scores = session["chunks"]
+        for source in sources:
+            if "id" in source:
+                scores[source["id"]] = source["relevance_score"]
+        retained = {chunk_id for turn in session["turns"] for chunk_id in turn["chunk_ids"]}
+        session["chunks"] = {chunk_id: score for chunk_id, score in scores.items() if chunk_id in retained}
+        session["updated_at"] = time.time()
+
+        self._touch(key, session)
+        self.cache.set("session", key, session)
+
+    def _touch(self, key: str, session: Dict[str, Any]):
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def history_window(
+    turns: List[Dict[str, Any]],
+    count_tokens: Callable[[str], int],
+    budget: int = HISTORY_TOKEN_BUDGET
+) -> List[Dict[str, Any]]:
+    """The most recent turns whose questions and answers fit in budget tokens, oldest first"""
+    window = []
+    used = 0
+    for turn in reversed(turns):
+        used += count_tokens(turn["query"]) + count_tokens(turn["answer"])
+        if used > budget and window:
+            break
+        window.append(turn)
+    return list(reversed(window))
+
+
+__all__ = ['SessionStore', 'history_window', 'HISTORY_TOKEN_BUDGET']
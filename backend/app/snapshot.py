@@ -0,0 +1,206 @@
+"""
+Bulk snapshot export/import of the vector index
+Restores a corpus without re-embedding anything: vectors go to NumPy .npy
+shards (float32, or int8 with a per-vector scale) and chunk metadata/text to
+a columnar JSON file per shard.
+
+Layout of a snapshot directory:
+    snapshot.json               format info, shard list, document manifest
+    shard-00000.vectors.npy     (n, dims) float32 or int8
+    shard-00000.scales.npy      (n,) float32, int8 snapshots only
+    shard-00000.meta.json       {"id": [...], "text": [...], "source": [...], ...}
+
+Usage:
+    python -m app.snapshot export ./snapshots/2026-10-19 [--dtype int8]
+    python -m app.snapshot import ./snapshots/2026-10-19
+"""
+
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .rag_engine import RAGEngine
+
+
+FORMAT_NAME = "mini-rag-snapshot"
+FORMAT_VERSION = 1
+DEFAULT_SHARD_SIZE = 10000
+UPSERT_BATCH_SIZE = 100  # Pinecone caps request size at 2MB
+UPSERT_CONCURRENCY = 8
+
+
+def _quantize(vectors: np.ndarray):
+    """Symmetric per-vector int8 quantization; returns (codes, scales)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _write_shard(directory: Path, name: str, vectors: np.ndarray, records: List[Dict[str, Any]], dtype: str):
+    """Write one shard: a vector matrix plus column-oriented metadata"""
+    if dtype == "int8":
+        codes, scales = _quantize(vectors)
+        np.save(directory / f"{name}.vectors.npy", codes)
+        np.save(directory / f"{name}.scales.npy", scales)
+    else:
+        np.save(directory / f"{name}.vectors.npy", vectors)
+
+    columns = sorted({key for r in records for key in r})
+    meta = {column: [r.get(column) for r in records] for column in columns}
+    with open(directory / f"{name}.meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def _read_shard(directory: Path, name: str, dtype: str):
+    """
+    Load one shard as (ids, vectors, scales, per-row metadata dicts). Vectors
+    stay memory-mapped; scales is None unless the shard is int8.
+    """
+    vectors = np.load(directory / f"{name}.vectors.npy", mmap_mode="r")
+    scales = np.load(directory / f"{name}.scales.npy") if dtype == "int8" else None
+    with open(directory / f"{name}.meta.json", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    ids = meta.pop("id")
+    rows = [
+        # Pinecone rejects null metadata values, so drop the holes
+        {column: values[i] for column, values in meta.items() if values[i] is not None}
+        for i in range(len(ids))
+    ]
+    return ids, vectors, scales, rows
+
+
+async def export_snapshot(
+    engine: RAGEngine,
+    directory: Path,
+    dtype: str = "float32",
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    namespace: str = ""
+) -> Dict[str, Any]:
+    """
+    Stream every chunk in a namespace out of the index into a snapshot directory.
+    Each vector goes straight into a preallocated float32 shard matrix, so a
+    shard never holds its values as Python float lists.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    shards = []
+    vectors = np.empty((shard_size, engine.EMBEDDING_DIMENSIONS), dtype=np.float32)
+    buffer: List[Dict[str, Any]] = []
+
+    def flush():
+        name = f"shard-{len(shards):05d}"
+        _write_shard(directory, name, vectors[:len(buffer)], buffer, dtype)
+        shards.append({"name": name, "count": len(buffer)})
+        buffer.clear()
+
+    async for record in engine.iter_chunks(include_vectors=True, namespace=namespace):
+        if "next_cursor" in record:
+            continue
+        vectors[len(buffer)] = record.pop("values")
+        buffer.append(record)
+        if len(buffer) >= shard_size:
+            flush()
+    if buffer:
+        flush()
+
+    documents = []
+    cursor = None
+    while True:
+        page, cursor = engine.manifest.list_documents(cursor, 1000, namespace)
+        documents.extend(page)
+        if cursor is None:
+            break
+
+    info = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "embedding_model": engine.EMBEDDING_MODEL,
+        "dimensions": engine.EMBEDDING_DIMENSIONS,
+        "dtype": dtype,
+        "chunk_count": sum(s["count"] for s in shards),
+        "shards": shards,
+        "documents": documents
+    }
+    with open(directory / "snapshot.json", "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+async def import_snapshot(engine: RAGEngine, directory: Path, namespace: str = "") -> Dict[str, Any]:
+    """Upsert a snapshot straight into a namespace with large parallel batches"""
+    with open(directory / "snapshot.json", encoding="utf-8") as f:
+        info = json.load(f)
+    if info.get("format") != FORMAT_NAME:
+        raise ValueError(f"{directory} is not a {FORMAT_NAME} directory")
+    if info["dimensions"] != engine.EMBEDDING_DIMENSIONS:
+        raise ValueError(
+            f"Snapshot has {info['dimensions']}-dim vectors, "
+            f"index expects {engine.EMBEDDING_DIMENSIONS}"
+        )
+
+    semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+
+    async def upsert(ids, vectors, scales, rows, start):
+        # Float lists are only built for batches holding a semaphore slot
+        async with semaphore:
+            end = min(start + UPSERT_BATCH_SIZE, len(ids))
+            values = np.asarray(vectors[start:end], dtype=np.float32)
+            if scales is not None:
+                values = values * scales[start:end, None]
+            batch = [
+                {"id": ids[j], "values": values[j - start].tolist(), "metadata": rows[j]}
+                for j in range(start, end)
+            ]
+            await asyncio.to_thread(engine.index.upsert, vectors=batch, namespace=namespace)  # type: ignore
+
+    imported = 0
+    async with engine.writer_lock.acquire():
+        for shard in info["shards"]:
+            ids, vectors, scales, rows = _read_shard(directory, shard["name"], info["dtype"])
+            await asyncio.gather(*(
+                upsert(ids, vectors, scales, rows, i)
+                for i in range(0, len(ids), UPSERT_BATCH_SIZE)
+            ))
+            engine.manifest.record_chunks(zip(ids, (row.get("source", "") for row in rows)), namespace)
+            imported += len(ids)
+
+        for document in info.get("documents", []):
+            engine.manifest.record_document(**document, namespace=namespace)
+        engine._on_corpus_changed(namespace)
+
+    return {"chunks_count": imported, "documents_count": len(info.get("documents", []))}
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Export or import a vector index snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--dtype", choices=["float32", "int8"], default="float32")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--namespace", default="", help="Namespace to export from / import into")
+    args = parser.parse_args()
+
+    engine = RAGEngine()
+    if args.command == "export":
+        info = asyncio.run(export_snapshot(
+            engine, args.directory, args.dtype, args.shard_size, args.namespace
+        ))
+        print(f"Exported {info['chunk_count']} chunks in {len(info['shards'])} shards to {args.directory}")
+    else:
+        result = asyncio.run(import_snapshot(engine, args.directory, args.namespace))
+        print(f"Imported {result['chunks_count']} chunks ({result['documents_count']} documents)")
+
+
+__all__ = ['export_snapshot', 'import_snapshot']
+
+
+if __name__ == "__main__":
+    main()
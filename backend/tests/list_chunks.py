@@ -14,22 +14,28 @@ from pinecone import Pinecone
 pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
 idx = pc.Index('mini-rag')
 
-# Get all vectors
-results = idx.query(vector=[0]*768, top_k=50, include_metadata=True)
-
 print("=" * 60)
 print("ALL CHUNKS IN DATABASE")
 print("=" * 60)
-print(f"Total chunks found: {len(results['matches'])}")
 
-for i, match in enumerate(results['matches']):
-    meta = match.get('metadata', {})
-    print(f"\n{'='*60}")
-    print(f"CHUNK {i+1}")
-    print(f"{'='*60}")
-    print(f"ID: {match['id']}")
-    print(f"Source: {meta.get('source', 'N/A')}")
-    print(f"Title: {meta.get('title', 'N/A')}")
-    print(f"Position: {meta.get('position', 'N/A')}")
-    print(f"Text:\n{meta.get('text', 'N/A')[:500]}...")
-    print()
+# Page through every vector ID instead of a zero-vector query (which caps at top_k)
+count = 0
+for ids in idx.list(limit=100):
+    fetched = idx.fetch(ids=ids)
+    for vector_id in ids:
+        vector = fetched.vectors.get(vector_id)
+        if vector is None:
+            continue
+        count += 1
+        meta = vector.metadata or {}
+        print(f"\n{'='*60}")
+        print(f"CHUNK {count}")
+        print(f"{'='*60}")
+        print(f"ID: {vector_id}")
+        print(f"Source: {meta.get('source', 'N/A')}")
+        print(f"Title: {meta.get('title', 'N/A')}")
+        print(f"Position: {meta.get('position', 'N/A')}")
+        print(f"Text:\n{meta.get('text', 'N/A')[:500]}...")
+        print()
+
+print(f"Total chunks found: {count}")
@@ -0,0 +1,456 @@
+"""
+Load test for the RAG API
+Replays a mix of queries and ingests at a fixed arrival rate and reports
+throughput, latency percentiles, error rates and event-loop lag against SLOs.
+Most queries are perturbed gold-set questions, so they miss the answer cache
+and exercise the full pipeline; --repeat-ratio sets the share repeated verbatim.
+
+By default the app runs in-process (httpx ASGI transport) with deterministic
+stand-ins for Gemini, Cohere, Groq and Pinecone, so runs are reproducible and
+free. Pass --url to hit a running server (real providers) instead.
+
+Usage:
+    python load_test.py --rate 20 --duration 30
+    python load_test.py --url http://localhost:8000 --rate 2 --duration 60
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+# Keep the cache/manifest of stand-in runs away from real data
+os.environ.setdefault("RAG_DATA_DIR", tempfile.mkdtemp(prefix="rag-load-"))
+
+sys.path.append(str(Path(__file__).parent.parent))
+import httpx
+
+from tests.test_eval import GOLD_SET
+
+
+SAMPLE_DOCUMENTS = Path(__file__).parent / "sample_documents.txt"
+
+# Phrasings mixed into gold questions so queries miss the answer cache
+QUERY_PREFIXES = ["", "Can you tell me: ", "Quick question - ", "According to the docs, ", "I need to know: "]
+
+
+# ---------------------------------------------------------------------------
+# Provider stand-ins
+# ---------------------------------------------------------------------------
+
+def _hash_embedding(text: str, dims: int) -> List[float]:
+    """Bag-of-words feature hashing: similar texts get similar vectors"""
+    vector = [0.0] * dims
+    for word in re.findall(r"\w+", text.lower()):
+        bucket = int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dims
+        vector[bucket] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _Latency:
+    """Sleeps for a jittered delay; SDK calls run in worker threads so this blocks like I/O"""
+
+    def __init__(self, mean_ms: float, seed: int):
+        self.mean = mean_ms / 1000
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.random.uniform(0.5 * self.mean, 1.5 * self.mean)
+        time.sleep(delay)
+
+
+class FakeGenai:
+    def __init__(self, dims: int, latency: _Latency):
+        self.dims = dims
+        self.latency = latency
+        self.models = self
+
+    def embed_content(self, model, contents, config=None):
+        self.latency.wait()
+        texts = contents if isinstance(contents, list) else [contents]
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=_hash_embedding(t, self.dims)) for t in texts
+        ])
+
+
+class FakeCohere:
+    def __init__(self, latency: _Latency):
+        self.latency = latency
+
+    def rerank(self, model, query, documents, top_n):
+        self.latency.wait()
+        terms = set(re.findall(r"\w+", query.lower()))
+        scored = []
+        for i, doc in enumerate(documents):
+            words = set(re.findall(r"\w+", doc.lower()))
+            scored.append((len(terms & words) / (len(terms) or 1), i))
+        scored.sort(reverse=True)
+        return SimpleNamespace(results=[
+            SimpleNamespace(index=i, relevance_score=score) for score, i in scored[:top_n]
+        ])
+
+
+class FakeGroq:
+    def __init__(self, latency: _Latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, **kwargs):
+        self.latency.wait()
+        prompt = " ".join(m["content"] for m in messages)
+        prompt_tokens = len(prompt) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(
+                content="Stand-in answer based on the provided context [1]."
+            ))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=12,
+                total_tokens=prompt_tokens + 12
+            )
+        )
+
+
+class FakeIndex:
+    """In-memory brute-force cosine index with the subset of the Pinecone API we use"""
+
+    def __init__(self, latency: _Latency):
+        self.latency = latency
+        self.vectors: Dict[str, SimpleNamespace] = {}
+        self.lock = threading.Lock()
+
+    def upsert(self, vectors, namespace="", **kwargs):
+        self.latency.wait()
+        with self.lock:
+            for v in vectors:
+                self.vectors[v["id"]] = SimpleNamespace(
+                    id=v["id"], values=list(v["values"]), metadata=dict(v.get("metadata") or {})
+                )
+
+    def query(self, vector, top_k, include_metadata=True, **kwargs):
+        self.latency.wait()
+        with self.lock:
+            stored = list(self.vectors.values())
+        scored = [
+            SimpleNamespace(id=v.id, score=sum(a * b for a, b in zip(vector, v.values)), metadata=v.metadata)
+            for v in stored
+        ]
+        scored.sort(key=lambda m: m.score, reverse=True)
+        return SimpleNamespace(matches=scored[:top_k])
+
+    def delete(self, ids=None, delete_all=False, **kwargs):
+        self.latency.wait()
+        with self.lock:
+            if delete_all:
+                self.vectors.clear()
+            for i in ids or []:
+                self.vectors.pop(i, None)
+
+    def describe_index_stats(self):
+        # Single partition: the load test only uses the default namespace
+        return SimpleNamespace(
+            total_vector_count=len(self.vectors),
+            namespaces={"": SimpleNamespace(vector_count=len(self.vectors))}
+        )
+
+    def list_paginated(self, limit=100, pagination_token=None, **kwargs):
+        with self.lock:
+            ids = sorted(self.vectors)
+        start = int(pagination_token or 0)
+        page = ids[start:start + limit]
+        next_token = str(start + limit) if start + limit < len(ids) else None
+        return SimpleNamespace(
+            vectors=[SimpleNamespace(id=i) for i in page],
+            pagination=SimpleNamespace(next=next_token) if next_token else None
+        )
+
+    def fetch(self, ids, namespace="", **kwargs):
+        with self.lock:
+            return SimpleNamespace(vectors={i: self.vectors[i] for i in ids if i in self.vectors})
+
+
+def build_stand_in_engine(args):
+    """RAGEngine wired to stand-ins instead of provider SDKs"""
+    from app.rag_engine import RAGEngine
+
+    class StandInRAGEngine(RAGEngine):
+        def _init_clients(self):
+            self.genai_types = SimpleNamespace(EmbedContentConfig=lambda **kwargs: kwargs)
+            self.genai_client = FakeGenai(self.EMBEDDING_DIMENSIONS, _Latency(args.embed_ms, 1))
+            self.cohere_client = FakeCohere(_Latency(args.rerank_ms, 2))
+            self.groq_client = FakeGroq(_Latency(args.llm_ms, 3))
+            self.index = FakeIndex(_Latency(args.vector_ms, 4))
+
+    return StandInRAGEngine()
+
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def load_documents() -> List[Dict[str, str]]:
+    """Split sample_documents.txt into its individual documents"""
+    text = SAMPLE_DOCUMENTS.read_text(encoding="utf-8")
+    parts = re.split(r"=+\nDOCUMENT \d+: (.+)\n=+\n", text)
+    return [
+        {"title": parts[i].strip().title(), "text": parts[i + 1].strip()}
+        for i in range(1, len(parts) - 1, 2)
+    ]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.documents = load_documents()
+        self.questions = [g["question"] for g in GOLD_SET]
+        self.samples: List[Dict[str, Any]] = []
+        self.loop_lag_ms: List[float] = []
+        self.loop_lag_source = "client" if args.url else "in-process"
+
+    def _make_query(self) -> str:
+        """A gold question, verbatim (--repeat-ratio) or perturbed into a fresh cache key"""
+        question = self.random.choice(self.questions)
+        if self.random.random() < self.args.repeat_ratio:
+            return question
+        prefix = self.random.choice(QUERY_PREFIXES)
+        if prefix:
+            question = question[0].lower() + question[1:]
+        return f"{prefix}{question} (case {self.random.randrange(10**6)})"
+
+    async def _request(self, op: str):
+        if op == "ingest":
+            doc = self.random.choice(self.documents)
+            call = self.client.post("/ingest", json={
+                "text": doc["text"], "title": doc["title"], "source": f"load_{self.random.getrandbits(32):08x}"
+            })
+        else:
+            call = self.client.post("/query", json={"query": self._make_query()})
+
+        start = time.perf_counter()
+        citations = 0
+        cached = False
+        try:
+            response = await call
+            status = response.status_code
+            if op == "query" and status == 200:
+                body = response.json()
+                citations = len(body.get("citations", []))
+                cached = bool(body.get("cached"))
+        except Exception as e:
+            status = type(e).__name__
+        self.samples.append({
+            "op": op,
+            "status": status,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "citations": citations,
+            "cached": cached
+        })
+
+    async def _monitor_loop_lag(self, stop: asyncio.Event, interval: float = 0.05):
+        """
+        Measure how late a periodic timer fires. In-process this is the app's
+        loop too; against --url it is only the load generator's own loop.
+        """
+        while not stop.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag_ms.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    async def run(self) -> Dict[str, Any]:
+        # Seed the corpus so queries have something to retrieve
+        for doc in self.documents:
+            response = await self.client.post("/ingest", json={**doc, "source": f"seed_{doc['title']}"})
+            if response.status_code != 200:
+                raise RuntimeError(f"Seeding '{doc['title']}' failed: {response.status_code} {response.text}")
+
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self._monitor_loop_lag(stop))
+        tasks = []
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+
+        # Open-loop Poisson arrivals: load doesn't back off when the server slows down
+        while time.perf_counter() < deadline:
+            op = "ingest" if self.random.random() < self.args.ingest_ratio else "query"
+            tasks.append(asyncio.create_task(self._request(op)))
+            await asyncio.sleep(self.random.expovariate(self.args.rate))
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        if self.args.url:
+            await self._fetch_server_loop_lag()
+        return self.report(elapsed)
+
+    async def _fetch_server_loop_lag(self):
+        """Use the server's own loop lag when it runs with RAG_DIAGNOSTICS=1"""
+        try:
+            response = await self.client.get("/diagnostics")
+        except httpx.HTTPError:
+            return
+        if response.status_code == 200:
+            loop = response.json()["loop"]
+            self.server_loop_lag = (loop["lag_p99_ms"], loop["lag_max_ms"])
+            self.loop_lag_source = "server"
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        by_op: Dict[str, Any] = {}
+        for op in ("query", "ingest"):
+            samples = [s for s in self.samples if s["op"] == op]
+            if not samples:
+                continue
+            ok = [s["latency_ms"] for s in samples if s["status"] == 200]
+            errors = Counter(str(s["status"]) for s in samples if s["status"] != 200)
+            by_op[op] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(ok) / elapsed, 2),
+                "p50_ms": round(percentile(ok, 50), 1),
+                "p95_ms": round(percentile(ok, 95), 1),
+                "p99_ms": round(percentile(ok, 99), 1),
+                "error_rate": round(sum(errors.values()) / len(samples), 4),
+                "errors": dict(errors)
+            }
+            if op == "query":
+                by_op[op]["with_citations"] = sum(1 for s in samples if s["citations"])
+                # Cache hits skip the pipeline; a high share means the percentiles measure the cache
+                by_op[op]["cached_share"] = round(sum(1 for s in samples if s["cached"]) / max(1, len(ok)), 4)
+        if self.loop_lag_source == "server":
+            lag_p99, lag_max = self.server_loop_lag
+        else:
+            lag_p99 = round(percentile(self.loop_lag_ms, 99), 1)
+            lag_max = round(max(self.loop_lag_ms, default=0.0), 1)
+        return {
+            "mode": "remote" if self.args.url else "in-process stand-ins",
+            "target_rate_rps": self.args.rate,
+            "duration_s": round(elapsed, 2),
+            "operations": by_op,
+            "loop_lag_source": self.loop_lag_source,
+            "loop_lag_p99_ms": lag_p99,
+            "loop_lag_max_ms": lag_max
+        }
+
+
+def check_slos(report: Dict[str, Any], args) -> List[str]:
+    """Return a list of SLO violations (empty means pass)"""
+    violations = []
+    for op, stats in report["operations"].items():
+        if stats["p95_ms"] > args.slo_p95_ms:
+            violations.append(f"{op} p95 {stats['p95_ms']}ms > {args.slo_p95_ms}ms")
+        if stats["p99_ms"] > args.slo_p99_ms:
+            violations.append(f"{op} p99 {stats['p99_ms']}ms > {args.slo_p99_ms}ms")
+        if stats["error_rate"] > args.slo_error_rate:
+            violations.append(f"{op} error rate {stats['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+        # Fast 200s without citations mean retrieval found nothing, not a healthy run
+        if op == "query" and stats["error_rate"] < 1 and not stats["with_citations"]:
+            violations.append("no successful query returned citations")
+    # The load generator's own loop says nothing about the server's
+    if report["loop_lag_source"] != "client" and report["loop_lag_p99_ms"] > args.slo_loop_lag_ms:
+        violations.append(f"loop lag p99 {report['loop_lag_p99_ms']}ms > {args.slo_loop_lag_ms}ms")
+    return violations
+
+
+async def main(args) -> int:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        # Stand-ins are fast and free, so provider rate limits only get in the way
+        for provider in ("GEMINI", "COHERE", "GROQ"):
+            os.environ.setdefault(f"RAG_RPM_{provider}", "100000")
+        from app import main as api
+        api.rag_engine = build_stand_in_engine(args)
+        api.engine_state["status"] = "ready"
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api.app),
+            base_url="http://loadtest",
+            timeout=args.timeout
+        )
+
+    async with client:
+        report = await LoadTest(client, args).run()
+
+    violations = check_slos(report, args)
+    report["slo_violations"] = violations
+
+    print("=" * 60)
+    print(f"LOAD TEST ({report['mode']}, {args.rate} req/s for {report['duration_s']}s)")
+    print("=" * 60)
+    for op, stats in report["operations"].items():
+        print(f"{op:>7}: {stats['requests']} reqs, {stats['throughput_rps']} ok/s, "
+              f"p50 {stats['p50_ms']}ms, p95 {stats['p95_ms']}ms, p99 {stats['p99_ms']}ms, "
+              f"errors {stats['error_rate']:.2%} {stats['errors'] or ''}"
+              + (f", cached {stats['cached_share']:.0%}" if "cached_share" in stats else ""))
+    lag_label = {
+        "in-process": "Event loop lag",
+        "server": "Server event loop lag (/diagnostics)",
+        "client": "Load generator loop lag (not the server; run it with RAG_DIAGNOSTICS=1 for its lag)"
+    }[report["loop_lag_source"]]
+    print(f"{lag_label}: p99 {report['loop_lag_p99_ms']}ms, max {report['loop_lag_max_ms']}ms")
+    if violations:
+        print("\n✗ SLO VIOLATIONS")
+        for v in violations:
+            print(f"   - {v}")
+    else:
+        print("\n✓ All SLOs met")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    return 1 if violations else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the RAG API")
+    parser.add_argument("--url", help="Target a running server instead of in-process stand-ins")
+    parser.add_argument("--rate", type=float, default=10.0, help="Mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--ingest-ratio", type=float, default=0.05, help="Share of requests that ingest")
+    parser.add_argument("--repeat-ratio", type=float, default=0.1,
+                        help="Share of queries that repeat a gold question verbatim (answer-cache hits)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    # Stand-in provider latencies (mean, jittered +/-50%)
+    parser.add_argument("--embed-ms", type=float, default=150)
+    parser.add_argument("--vector-ms", type=float, default=80)
+    parser.add_argument("--rerank-ms", type=float, default=300)
+    parser.add_argument("--llm-ms", type=float, default=700)
+    # SLO thresholds
+    parser.add_argument("--slo-p95-ms", type=float, default=2500)
+    parser.add_argument("--slo-p99-ms", type=float, default=5000)
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-loop-lag-ms", type=float, default=100)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit_code = asyncio.run(main(parse_args()))
+    exit(exit_code)
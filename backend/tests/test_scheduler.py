@@ -0,0 +1,29 @@
+"""
+Scheduler checks: admission estimates must account for tokens refilled while idle
+
+    python test_scheduler.py
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from app.scheduler import ProviderQueue
+
+
+def test_expected_wait_counts_tokens_refilled_while_idle():
+    # Cohere on the free tier split across two workers: 5 rpm, burst 1
+    queue = ProviderQueue("cohere", rate_per_minute=5, burst=1, max_wait=30)
+    queue.bucket.tokens = 0.0
+    queue.bucket.updated -= 3600  # Drained an hour ago, idle since
+
+    # Two requests already queued; the bucket is full again, so the third
+    # waits for two refills (24s), not three (36s, which would be rejected)
+    queue._waiters = [(0, 0, None), (0, 1, None)]
+    assert abs(queue.expected_wait() - 24.0) < 0.1
+    assert queue.stats()["tokens"] == 1.0
+
+
+if __name__ == "__main__":
+    test_expected_wait_counts_tokens_refilled_while_idle()
+    print("ok")
@@ -12,12 +12,17 @@ import {
   Trash2,
   ChevronDown,
   ChevronUp,
-  ExternalLink
+  ExternalLink,
+  MessageSquarePlus
 } from 'lucide-react';
 
 // API base URL - update for production
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Each chat gets its own server-side session so follow-ups can build on earlier turns
+const newSessionId = () =>
+  crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 function App() {
   // State
   const [activeTab, setActiveTab] = useState('query'); // 'ingest' or 'query'
@@ -28,6 +33,8 @@ function App() {
   const [message, setMessage] = useState(null);
   const [queryResult, setQueryResult] = useState(null);
   const [expandedCitation, setExpandedCitation] = useState(null);
+  const [sessionId, setSessionId] = useState(newSessionId);
+  const [history, setHistory] = useState([]); // Earlier turns of the current chat
   const fileInputRef = useRef(null);
 
   // Ingest text
@@ -46,8 +53,7 @@ function App() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           text: text,
-          title: title || 'Untitled Document',
-          source: 'user_input'
+          title: title || 'Untitled Document'
         })
       });
 
@@ -115,6 +121,9 @@ function App() {
 
     setIsLoading(true);
     setMessage(null);
+    if (queryResult) {
+      setHistory((prev) => [...prev, { query: queryResult.query, answer: queryResult.answer }]);
+    }
     setQueryResult(null);
 
     try {
@@ -124,14 +133,16 @@ function App() {
         body: JSON.stringify({
           query: query,
           top_k: 10,
-          rerank_top_k: 5
+          rerank_top_k: 5,
+          session_id: sessionId
         })
       });
 
       const data = await response.json();
 
       if (response.ok) {
-        setQueryResult(data);
+        setQueryResult({ ...data, query });
+        setQuery('');
       } else {
         setMessage({ type: 'error', text: data.detail || 'Query failed' });
       }
@@ -142,6 +153,15 @@ function App() {
     }
   };
 
+  // Start a new chat (fresh session, no history)
+  const handleNewChat = () => {
+    setSessionId(newSessionId());
+    setHistory([]);
+    setQueryResult(null);
+    setExpandedCitation(null);
+    setQuery('');
+  };
+
   // Clear index
   const handleClearIndex = async () => {
     if (!confirm('Are you sure you want to clear all documents from the knowledge base?')) {
@@ -155,7 +175,7 @@ function App() {
       
       if (response.ok) {
         setMessage({ type: 'success', text: 'Knowledge base cleared successfully' });
-        setQueryResult(null);
+        handleNewChat();
       } else {
         setMessage({ type: 'error', text: data.detail || 'Failed to clear' });
       }
@@ -361,10 +381,22 @@ function App() {
           <div className="space-y-6">
             {/* Query Input */}
             <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-6">
-              <h2 className="text-lg font-semibold text-gray-900 mb-4 flex items-center">
-                <Search className="w-5 h-5 mr-2 text-blue-500" />
-                Ask a Question
-              </h2>
+              <div className="flex items-center justify-between mb-4">
+                <h2 className="text-lg font-semibold text-gray-900 flex items-center">
+                  <Search className="w-5 h-5 mr-2 text-blue-500" />
+                  {history.length > 0 || queryResult ? 'Ask a Follow-up' : 'Ask a Question'}
+                </h2>
+                {(history.length > 0 || queryResult) && (
+                  <button
+                    onClick={handleNewChat}
+                    disabled={isLoading}
+                    className="flex items-center px-3 py-2 text-sm text-blue-600 hover:bg-blue-50 rounded-lg transition-colors disabled:text-gray-400"
+                  >
+                    <MessageSquarePlus className="w-4 h-4 mr-2" />
+                    New chat
+                  </button>
+                )}
+              </div>
 
               <div className="flex space-x-4">
                 <input
@@ -395,6 +427,18 @@ function App() {
               </div>
             </div>
 
+            {/* Earlier turns of this chat */}
+            {history.length > 0 && (
+              <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-6 space-y-4">
+                {history.map((turn, index) => (
+                  <div key={index} className="border-b border-gray-100 pb-4 last:border-0 last:pb-0">
+                    <p className="font-medium text-gray-900 mb-1">{turn.query}</p>
+                    <p className="text-sm text-gray-600 whitespace-pre-wrap">{turn.answer}</p>
+                  </div>
+                ))}
+              </div>
+            )}
+
             {/* Loading State */}
             {isLoading && (
               <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-8 text-center">
@@ -412,7 +456,13 @@ function App() {
               <div className="space-y-6">
                 {/* Answer */}
                 <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-6">
-                  <h2 className="text-lg font-semibold text-gray-900 mb-4">Answer</h2>
+                  <h2 className="text-lg font-semibold text-gray-900 mb-1">Answer</h2>
+                  <p className="text-sm text-gray-500 mb-4">
+                    {queryResult.query}
+                    {queryResult.standalone_query && queryResult.standalone_query !== queryResult.query && (
+                      <> • Searched for: {queryResult.standalone_query}</>
+                    )}
+                  </p>
                   <div className="prose prose-blue max-w-none text-gray-700 leading-relaxed">
                     {renderAnswerWithCitations(queryResult.answer)}
                   </div>
@@ -521,7 +571,7 @@ function App() {
             )}
 
             {/* Empty State */}
-            {!queryResult && !isLoading && (
+            {!queryResult && !isLoading && history.length === 0 && (
               <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-12 text-center">
                 <Search className="w-16 h-16 mx-auto text-gray-300 mb-4" />
                 <h3 className="text-lg font-medium text-gray-900 mb-2">Ready to Search</h3>